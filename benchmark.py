@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""christmas_tree 렌더링 벤치마크
+
+sleep 없이 메모리 싱크(바이트 수만 세는 객체)에 프레임을 써서 렌더링 비용만 잰다.
+
+    python benchmark.py build --scales 1 2 4 8
+    python benchmark.py encoders --scales 1 4
+    python benchmark.py rich --scales 1 4      (Rich 필요)
+    python benchmark.py effects --scales 1 8 30
+    python benchmark.py snow --counts 1000 10000 30000
+    python benchmark.py startup --repeat 5      (pty 필요)
+    python benchmark.py suite --json results.json
+    python benchmark.py compare old.json new.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import christmas_tree as ct
+
+
+class CountingSink:
+    """쓰인 바이트 수(utf-8 기준)만 세고 내용은 버리는 출력 대상 (str/bytes 모두 받음)"""
+
+    encoding = 'utf-8'
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes += len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+        self.writes += 1
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class VirtualClock:
+    """sleep하면 시간만 앞으로 가는 가짜 시계 (스케줄러를 실제로 기다리지 않게 함)"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def run_build(scale: int, mode: str = 'double', density: float = 0.25, cached: bool = True, seed: int = 0):
+    """빌드 애니메이션 한 번(모든 요소를 하나씩 드러내며 매번 렌더)에 걸린 시간"""
+    random.seed(seed)
+    width = 50 * scale
+    tree = ct.create_tree_structure(mode=mode, density=density, max_width=width, scale=scale)
+    tree.set_all_visible(False)
+    sink = CountingSink()
+    start = time.perf_counter()
+    for idx in range(tree.n_elements):
+        tree.set_visible(idx, True)
+        sink.write(ct.print_tree_with_lights(tree, 0, cached=cached))
+    elapsed = time.perf_counter() - start
+    return tree.n_elements, elapsed
+
+
+def bench_build(scales, mode: str = 'double', full_limit: int = 4):
+    """트리 크기별 전체 빌드 시간: 행 캐시 vs 매 단계 전체 렌더"""
+    print(f"{'scale':>5} {'elements':>9} {'row-cache s':>12} {'us/step':>9} {'full s':>9} {'us/step':>9}")
+    for scale in scales:
+        n, cached_s = run_build(scale, mode=mode, cached=True)
+        line = f"{scale:>5} {n:>9} {cached_s:>12.3f} {cached_s / n * 1e6:>9.1f}"
+        if scale <= full_limit:
+            _, full_s = run_build(scale, mode=mode, cached=False)
+            line += f" {full_s:>9.3f} {full_s / n * 1e6:>9.1f}"
+        else:
+            line += f" {'-':>9} {'-':>9}"
+        print(line)
+
+
+def bench_encoders(scales, mode: str = 'double', repeat: int = 20):
+    """ANSI 인코더별 프레임 크기와 렌더 시간 (캐시 없이), Rich가 있으면 Text.from_ansi 시간도"""
+    print(f"{'scale':>5} {'encoder':>7} {'bytes/frame':>12} {'render ms':>10} {'from_ansi ms':>13}")
+    for scale in scales:
+        random.seed(0)
+        tree = ct.create_tree_structure(mode=mode, max_width=50 * scale, scale=scale)
+        for encoder in ct.ENCODERS:
+            start = time.perf_counter()
+            for i in range(repeat):
+                frame = ct.print_tree_with_lights(tree, i % 4, cached=False, encoder=encoder)
+            render_ms = (time.perf_counter() - start) / repeat * 1e3
+            size = len(frame.encode('utf-8'))
+            parse = '-'
+            if ct.load_rich():
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    ct.Text.from_ansi(frame)
+                parse = f"{(time.perf_counter() - start) / repeat * 1e3:.2f}"
+            print(f"{scale:>5} {encoder:>7} {size:>12} {render_ms:>10.2f} {parse:>13}")
+
+
+def bench_rich(scales, mode: str = 'double', repeat: int = 20):
+    """Rich Live 한 번 갱신 비용: Text.from_ansi 경로 vs TreeRenderable
+
+    cold: 트리가 바뀐 직후(캐시 없음) 한 프레임을 만들어 그리는 비용
+    refresh: 같은 프레임을 Live가 다시 그리는 비용 (refresh_per_second마다 발생)
+    """
+    if not ct.load_rich():
+        print('rich가 설치되어 있지 않습니다')
+        return
+    import io
+    console = ct.Console(file=io.StringIO(), force_terminal=True, color_system='truecolor', width=1000)
+    paths = {
+        'from_ansi': lambda tree, f: ct.render_full_rich(tree, f),
+        'native': lambda tree, f: ct.TreeRenderable(tree, f),
+    }
+    print(f"{'scale':>5} {'path':>10} {'cold ms':>9} {'refresh ms':>11}")
+    for scale in scales:
+        random.seed(0)
+        tree = ct.create_tree_structure(mode=mode, max_width=50 * scale, scale=scale)
+        for name, make in paths.items():
+            start = time.perf_counter()
+            for i in range(repeat):
+                tree.touch()
+                ct.FRAME_CACHE.clear()
+                list(console.render(make(tree, i % 4)))
+            cold_ms = (time.perf_counter() - start) / repeat * 1e3
+            renderable = make(tree, 0)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(console.render(renderable))
+            refresh_ms = (time.perf_counter() - start) / repeat * 1e3
+            print(f"{scale:>5} {name:>10} {cold_ms:>9.2f} {refresh_ms:>11.2f}")
+
+
+def bench_effects(scales, mode: str = 'double', frames: int = 40):
+    """조명 효과별 프레임당 스타일 계산 시간 (캐시 없이)과 프레임 예산(MIN_FRAME_INTERVAL) 대비 비율"""
+    budget_ms = ct.MIN_FRAME_INTERVAL * 1e3
+    print(f"{'scale':>5} {'lights':>8} {'effect':>8} {'ms/frame':>9} {'budget %':>9}")
+    for scale in scales:
+        random.seed(0)
+        tree = ct.create_tree_structure(mode=mode, max_width=50 * scale, scale=scale)
+        for name, factory in ct.EFFECTS.items():
+            tree.set_effect(factory(0))
+            lights = len(ct._light_data(tree)[0])
+            start = time.perf_counter()
+            for i in range(frames):
+                tree._effects.pop('styles', None)
+                ct.light_styles(tree, i)
+            ms = (time.perf_counter() - start) / frames * 1e3
+            print(f"{scale:>5} {lights:>8} {name:>8} {ms:>9.2f} {ms / budget_ms * 100:>8.1f}%")
+
+
+def bench_snow(counts, scale: int = 8, mode: str = 'double', frames: int = 48):
+    """눈 입자 수별 프레임당 비용: step(입자 갱신), 셀 그리드 합성, diff 인코딩 (SNOW_INTERVAL 대비 비율)"""
+    budget_ms = ct.SNOW_INTERVAL * 1e3
+    random.seed(0)
+    tree = ct.create_tree_structure(mode=mode, max_width=50 * scale, scale=scale)
+    width, height = ct.snow_field(tree)
+    print(f"field {width}x{height}")
+    print(f"{'particles':>9} {'step ms':>8} {'grid ms':>8} {'encode ms':>10} {'B/frame':>8} {'budget %':>9}")
+    for count in counts:
+        snow = ct.Snowfall(count, width, height, wind=2.0, seed=0)
+        out = ct.DiffRenderer(stream=CountingSink())
+        out.encode(ct.frame_grid(tree, 0, 0, snow.overlay), ct.snow_grid_rows(snow.overlay))
+        step = grid = encode = 0.0
+        size = 0
+        for i in range(frames):
+            t0 = time.perf_counter()
+            snow.step(ct.SNOW_INTERVAL)
+            t1 = time.perf_counter()
+            frame = ct.frame_grid(tree, i // 12, i // 12, snow.overlay)
+            t2 = time.perf_counter()
+            size += len(out.encode(frame, ct.snow_grid_rows(snow.overlay)))
+            t3 = time.perf_counter()
+            step += t1 - t0
+            grid += t2 - t1
+            encode += t3 - t2
+        total = (step + grid + encode) / frames * 1e3
+        print(f"{count:>9} {step / frames * 1e3:>8.2f} {grid / frames * 1e3:>8.2f} {encode / frames * 1e3:>10.2f} "
+              f"{size / frames:>8.0f} {total / budget_ms * 100:>8.1f}%")
+
+
+def _first_frame_seconds(args, marker: bytes = 'Merry Christmas'.encode(), size=(40, 120),
+                         timeout: float = 20.0) -> float:
+    """pty에서 christmas_tree.py를 실행해 marker가 처음 출력될 때까지 걸린 시간(초)
+
+    인터프리터 시작, import, 트리 생성, 첫 렌더를 모두 포함한다. 확인한 뒤 프로세스는 바로 끝낸다.
+    """
+    import fcntl
+    import pty
+    import select
+    import struct
+    import termios
+    master, slave = pty.openpty()
+    fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', size[0], size[1], 0, 0))
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, ct.__file__, *args], stdin=subprocess.DEVNULL, stdout=slave,
+                            stderr=subprocess.DEVNULL, env=dict(os.environ, COLUMNS=str(size[1])))
+    os.close(slave)
+    seen = b''
+    try:
+        while True:
+            remaining = start + timeout - time.perf_counter()
+            if remaining <= 0 or not select.select([master], [], [], remaining)[0]:
+                raise TimeoutError(f"no first frame within {timeout}s: {args}")
+            try:
+                data = os.read(master, 65536)
+            except OSError:  # 자식이 pty를 닫음 (Linux는 EIO)
+                data = b''
+            if not data:
+                raise RuntimeError(f"exited before the first frame: {args}")
+            seen += data
+            if marker in seen:
+                return time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+        os.close(master)
+
+
+def bench_startup(modes, outputs, repeat: int = 5):
+    """--mode/--build/--output 조합별 첫 프레임까지의 시간 (프로세스 시작부터, pty에서 실행)
+
+    비교를 위해 빈 인터프리터 시작과 import christmas_tree 시간도 함께 잰다.
+    """
+    def median_ms(run):
+        times = sorted(run() for _ in range(repeat))
+        return times[len(times) // 2] * 1e3, times[0] * 1e3
+
+    def python_seconds(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(ct.__file__)))
+        return time.perf_counter() - start
+
+    print(f"{'case':<28} {'median ms':>10} {'min ms':>8}")
+    for name, code in (('python -c pass', 'pass'), ('import christmas_tree', 'import christmas_tree')):
+        med, best = median_ms(lambda: python_seconds(code))
+        print(f"{name:<28} {med:>10.1f} {best:>8.1f}")
+    for mode in modes:
+        for build in (False, True):
+            for output in outputs:
+                args = ['--mode', mode, '--output', output, '--duration', '5', '--music', '']
+                if build:
+                    args.append('--build')
+                med, best = median_ms(lambda: _first_frame_seconds(args))
+                name = f"{mode} {'build' if build else 'static'} {output}"
+                print(f"{name:<28} {med:>10.1f} {best:>8.1f}")
+
+
+# suite에서 비교하는 출력 경로와 단계
+PATHS = ('fallback-plain', 'fallback-diff', 'rich-native', 'rich-ansi')
+PHASES = ('generate', 'twinkle', 'build', 'teardown')
+
+
+def _make_output(path: str, sink, width: int):
+    """경로 이름에 맞는 show(tree, frame, footer_frame) 함수"""
+    if path == 'fallback-plain':
+        def show(tree, frame, footer_frame=None):
+            sink.write(ct.render_fallback_frame(tree, frame, footer_frame))
+    elif path == 'fallback-diff':
+        diff = ct.DiffRenderer(sink)
+
+        def show(tree, frame, footer_frame=None):
+            diff.render(ct.frame_grid(tree, frame, footer_frame))
+    else:
+        console = ct.Console(file=sink, force_terminal=True, color_system='truecolor', width=width + 10)
+        if path == 'rich-native':
+            def show(tree, frame, footer_frame=None):
+                console.print(ct.TreeRenderable(tree, frame, footer_frame))
+        else:
+            def show(tree, frame, footer_frame=None):
+                console.print(ct.render_full_rich(tree, frame))
+    return show
+
+
+class FrameMemory:
+    """프레임 하나를 그리는 동안 늘어난 메모리 최고치(tracemalloc)를 프레임마다 모은다"""
+
+    def __init__(self):
+        self.total = 0
+        self.frames = 0
+
+    def wrap(self, fn):
+        def wrapped(*args):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            self.total += peak - before
+            self.frames += 1
+            return result
+        return wrapped
+
+
+def _run_phase(phase: str, path: str, mode: str, width: int, density: float, scale: int,
+               frames: int, step_time: float, sink, wrap=None):
+    """한 단계를 실행하고 렌더한 프레임 수를 반환 (sleep 없음)
+
+    wrap이 있으면 프레임 하나(generate는 트리 생성 한 번)를 그리는 함수를 감싼다.
+    """
+    wrap = wrap or (lambda fn: fn)
+    random.seed(0)
+    ct.FRAME_CACHE.clear()
+    generate = wrap(ct.create_tree_structure)
+    tree = generate(mode, density, width, 1, scale)
+    if phase == 'generate':
+        for _ in range(frames - 1):
+            generate(mode, density, width, 1, scale)
+        return frames
+    show = wrap(_make_output(path, sink, width))
+    if phase == 'twinkle':
+        for frame in range(frames):
+            show(tree, frame, frame)
+        return frames
+    # build/teardown: animate_tree와 같은 run_transition을 가짜 시계로 돌린다
+    building = phase == 'build'
+    tree.set_all_visible(not building)
+    positions = ct.transition_schedule(tree, 'sequential' if building else 'reverse', 0, phase)
+    clock = VirtualClock()
+    sched = ct.run_transition(tree, positions, building, step_time, lambda: show(tree, 0),
+                              clock=clock, sleep=clock.sleep)
+    return sched.frames + 1
+
+
+def measure_case(phase: str, path: str, mode: str, width: int, density: float, scale: int = 1,
+                 frames: int = 40, step_time: float = 0.005) -> dict:
+    """한 조합의 fps, 프레임당 바이트, 메모리 지표를 측정
+
+    peak_kb: 단계 전체의 tracemalloc 최대 사용량 (트리와 캐시 포함)
+    frame_peak_kb: 프레임 하나를 그리는 동안 늘어난 메모리 최고치의 평균 (추정치)
+    retained_blocks_per_frame: 프레임당 해제되지 않고 남는 메모리 블록 수 (sys.getallocatedblocks
+        증가분, 대부분 캐시가 커진 몫. 추정치)
+
+    CPython은 할당 횟수 자체를 세지 않으므로 둘 다 프레임당 할당 수가 아니다.
+    """
+    # 1) 시간 측정 (tracemalloc 없이)
+    sink = CountingSink()
+    start = time.perf_counter()
+    n = _run_phase(phase, path, mode, width, density, scale, frames, step_time, sink)
+    elapsed = time.perf_counter() - start
+
+    # 2) 메모리 측정 (tracemalloc은 느리므로 따로 한 번 더)
+    memory = FrameMemory()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    _run_phase(phase, path, mode, width, density, scale, frames, step_time, CountingSink())
+    _, peak = tracemalloc.get_traced_memory()
+    # 같은 단계를 한 번 더 돌리면서 프레임별 증가량을 잰다
+    _run_phase(phase, path, mode, width, density, scale, frames, step_time, CountingSink(), wrap=memory.wrap)
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+
+    return {
+        'phase': phase, 'path': path, 'mode': mode, 'width': width, 'density': density, 'scale': scale,
+        'frames': n,
+        'fps': n / elapsed if elapsed > 0 else float('inf'),
+        'ms_per_frame': elapsed / n * 1e3,
+        'bytes_per_frame': sink.bytes / n,
+        'peak_kb': peak / 1024,
+        'frame_peak_kb': memory.total / 1024 / max(memory.frames, 1),
+        'retained_blocks_per_frame': (blocks_after - blocks_before) / (2 * n),
+    }
+
+
+def case_key(result: dict) -> tuple:
+    return (result['phase'], result['path'], result['mode'], result['width'], result['density'], result['scale'])
+
+
+def run_suite(widths, densities, modes, paths, phases, scales, frames: int = 40) -> dict:
+    """모든 조합을 측정해서 JSON으로 저장할 수 있는 dict 반환"""
+    if not ct.load_rich():
+        skipped = [p for p in paths if p.startswith('rich')]
+        if skipped:
+            print(f"rich가 없어 {', '.join(skipped)} 경로는 건너뜁니다", file=sys.stderr)
+        paths = [p for p in paths if not p.startswith('rich')]
+    results = []
+    for phase in phases:
+        # 트리 생성은 출력 경로와 무관하므로 한 번만 잰다
+        phase_paths = ['-'] if phase == 'generate' else paths
+        for mode in modes:
+            for width in widths:
+                for density in densities:
+                    for scale in scales:
+                        for path in phase_paths:
+                            r = measure_case(phase, path, mode, width, density, scale, frames=frames)
+                            results.append(r)
+                            print(f"{phase:>9} {path:>14} {mode:>6} w={width:<5} d={density:<5} s={scale:<2} "
+                                  f"{r['fps']:>9.1f} fps {r['bytes_per_frame']:>9.0f} B/frame "
+                                  f"{r['peak_kb']:>8.0f} KB peak {r['frame_peak_kb']:>7.1f} KB peak/frame",
+                                  file=sys.stderr)
+    return {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': ct.load_numpy() is not None,
+            'numpy_min_size': ct.NUMPY_MIN_SIZE,
+            'rich': ct.load_rich(),
+            'frames': frames,
+            # 할당 횟수가 아닌 추정치인 메모리 지표 (measure_case 참고)
+            'estimates': {
+                'frame_peak_kb': 'tracemalloc peak growth while rendering one frame (KB)',
+                'retained_blocks_per_frame': 'sys.getallocatedblocks() growth per frame (blocks kept alive)',
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 0.10) -> int:
+    """두 suite 결과 비교: fps가 threshold 이상 떨어지거나 bytes/peak이 늘면 회귀로 표시
+
+    회귀 개수를 반환한다.
+    """
+    old_by_key = {case_key(r): r for r in old['results']}
+    regressions = 0
+    print(f"{'case':<52} {'fps':>16} {'B/frame':>18} {'peak KB':>16}")
+    for r in new['results']:
+        o = old_by_key.get(case_key(r))
+        if o is None:
+            continue
+        fps_ratio = r['fps'] / o['fps'] if o['fps'] else 1.0
+        bad = fps_ratio < 1 - threshold
+        bad |= r['bytes_per_frame'] > o['bytes_per_frame'] * (1 + threshold) + 1
+        bad |= r['peak_kb'] > o['peak_kb'] * (1 + threshold) + 64
+        regressions += bad
+        name = '/'.join(str(v) for v in case_key(r))
+        print(f"{name:<52} {o['fps']:>7.0f}->{r['fps']:<7.0f} {o['bytes_per_frame']:>8.0f}->{r['bytes_per_frame']:<8.0f} "
+              f"{o['peak_kb']:>7.0f}->{r['peak_kb']:<7.0f}{'  REGRESSION' if bad else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='christmas_tree 렌더링 벤치마크')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help='트리 크기에 따른 빌드 애니메이션 총 시간')
+    p_build.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4, 8], help='트리 크기 배율 목록')
+    p_build.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드')
+    p_build.add_argument('--full-limit', type=int, default=4,
+                         help='이 배율까지만 전체 렌더(캐시 없음)와 비교 (O(N^2)이라 느림)')
+
+    p_enc = sub.add_parser('encoders', help='ANSI 인코더(plain/rle) 출력 크기와 렌더 시간 비교')
+    p_enc.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4], help='트리 크기 배율 목록')
+    p_enc.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드')
+    p_enc.add_argument('--repeat', type=int, default=20, help='측정 반복 횟수')
+
+    p_rich = sub.add_parser('rich', help='Rich 갱신 비용: Text.from_ansi 경로 vs 네이티브 렌더러블')
+    p_rich.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4], help='트리 크기 배율 목록')
+    p_rich.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드')
+    p_rich.add_argument('--repeat', type=int, default=20, help='측정 반복 횟수')
+
+    p_fx = sub.add_parser('effects', help='조명 효과별 프레임당 스타일 계산 비용')
+    p_fx.add_argument('--scales', type=int, nargs='+', default=[1, 8, 30], help='트리 크기 배율 목록')
+    p_fx.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드')
+    p_fx.add_argument('--frames', type=int, default=40, help='측정할 프레임 수')
+
+    p_snow = sub.add_parser('snow', help='눈 입자 수에 따른 프레임당 갱신/합성/인코딩 비용')
+    p_snow.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 30000], help='입자 수 목록')
+    p_snow.add_argument('--scale', type=int, default=8, help='트리 크기 배율')
+    p_snow.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드')
+    p_snow.add_argument('--frames', type=int, default=48, help='측정할 프레임 수')
+
+    p_start = sub.add_parser('startup', help='--mode/--build/--output 조합별 첫 프레임까지의 시간 (프로세스 시작부터)')
+    p_start.add_argument('--modes', nargs='+', choices=['single', 'double'], default=['single', 'double'])
+    p_start.add_argument('--outputs', nargs='+', choices=['live', 'plain', 'diff'], default=['live', 'diff'],
+                         help='출력 방식 목록')
+    p_start.add_argument('--repeat', type=int, default=5, help='조합마다 실행할 횟수 (중앙값을 보고)')
+
+    p_suite = sub.add_parser('suite', help='폭/밀도/모드/출력 경로를 훑는 전체 벤치마크 (JSON 저장)',
+                             description='메모리 지표 frame_peak_kb(프레임당 최고치 증가)와 '
+                                         'retained_blocks_per_frame(프레임당 남는 블록)은 추정치이며 할당 횟수가 아니다.')
+    p_suite.add_argument('--widths', type=int, nargs='+', default=[50, 200, 1000], help='--width 값 목록')
+    p_suite.add_argument('--densities', type=float, nargs='+', default=[0.1, 0.25, 0.6], help='--density 값 목록')
+    p_suite.add_argument('--modes', nargs='+', choices=['single', 'double'], default=['single', 'double'])
+    p_suite.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS), help='출력 경로 목록')
+    p_suite.add_argument('--phases', nargs='+', choices=PHASES, default=list(PHASES), help='측정할 단계 목록')
+    p_suite.add_argument('--scales', type=int, nargs='+', default=[1], help='트리 크기 배율 목록')
+    p_suite.add_argument('--frames', type=int, default=40, help='twinkle/generate 단계의 프레임 수')
+    p_suite.add_argument('--json', default=None, help='결과를 저장할 JSON 파일 (없으면 stdout)')
+
+    p_cmp = sub.add_parser('compare', help='두 suite JSON 결과를 비교해 회귀를 표시')
+    p_cmp.add_argument('old', help='기준 결과 JSON')
+    p_cmp.add_argument('new', help='새 결과 JSON')
+    p_cmp.add_argument('--threshold', type=float, default=0.10, help='허용 비율 (기본 10%%)')
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        bench_build(args.scales, mode=args.mode, full_limit=args.full_limit)
+    elif args.command == 'encoders':
+        bench_encoders(args.scales, mode=args.mode, repeat=args.repeat)
+    elif args.command == 'rich':
+        bench_rich(args.scales, mode=args.mode, repeat=args.repeat)
+    elif args.command == 'effects':
+        bench_effects(args.scales, mode=args.mode, frames=args.frames)
+    elif args.command == 'snow':
+        bench_snow(args.counts, scale=args.scale, mode=args.mode, frames=args.frames)
+    elif args.command == 'startup':
+        bench_startup(args.modes, args.outputs, repeat=args.repeat)
+    elif args.command == 'suite':
+        report = run_suite(args.widths, args.densities, args.modes, args.paths, args.phases, args.scales,
+                           frames=args.frames)
+        text = json.dumps(report, indent=2)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+    elif args.command == 'compare':
+        with open(args.old, encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,22 +5,37 @@ import time
 import random
 import sys
 import os
-import subprocess
-import platform
+import signal
 import argparse
-from typing import List
+import contextlib
+import itertools
+import math
+import unicodedata
+from array import array
+from collections import OrderedDict, deque
+from typing import List, NamedTuple
+# rich와 NumPy는 import만으로 수십 ms가 걸리므로 필요한 경로에서 처음 쓸 때 불러온다
+# (load_rich, load_numpy). multiprocessing, asyncio, subprocess, json, mmap, platform, shutil도
+# 쓰는 함수 안에서 불러온다
+Console = None
+Live = None
+Text = None
+Segment = None
+Style = None
+_rich_loaded = None
+_numpy = None
+_numpy_loaded = False
 try:
-    from rich.console import Console
-    from rich.live import Live
-    from rich.text import Text
-except Exception:
-    Console = None
-    Live = None
-    Text = None
-try:
-    import numpy as np
-except Exception:
-    np = None
+    import termios
+    import tty
+except ImportError:  # Windows 등: 키보드 조작 없이 실행
+    termios = None
+    tty = None
+
+# Colors.rgb가 만든 escape 문자열: (r, g, b) -> escape, escape -> Rich 스타일 이름
+_RGB_CODES = {}
+_RGB_RICH = {}
+
 
 # 터미널 색상 코드
 class Colors:
@@ -34,458 +49,3052 @@ class Colors:
     
     @staticmethod
     def rgb(r: int, g: int, b: int) -> str:
-        """RGB 색상 코드 생성"""
-        return f'\033[38;2;{r};{g};{b}m'
+        """RGB 색상 코드 생성 (같은 색은 한 번 만든 문자열을 재사용)"""
+        code = _RGB_CODES.get((r, g, b))
+        if code is None:
+            code = _RGB_CODES[(r, g, b)] = f'\033[38;2;{r};{g};{b}m'
+            _RGB_RICH[code] = f'rgb({r},{g},{b})'
+        return code
 
 def clear_screen():
     """터미널 화면 초기화"""
     sys.stdout.write('\033[2J\033[H')
     sys.stdout.flush()
 
-def create_tree_structure(mode: str = 'double', density: float = 0.25, max_width: int = 50, gap: int = 1):
-    """조명 위치를 미리 정한 크리스마스 트리 생성
+# 팔레트: 트리에 쓰이는 모든 색. 셀 배열에는 이 표의 인덱스만 저장한다
+PALETTE = [
+    Colors.GREEN,                # 0 트리 (위 삼각형)
+    Colors.rgb(34, 139, 34),     # 1 트리 (아래 삼각형)
+    Colors.rgb(0, 100, 0),       # 2 트리 (진한 초록)
+    Colors.RED,                  # 3 조명
+    Colors.YELLOW,               # 4 조명 / 별
+    Colors.CYAN,                 # 5 조명
+    Colors.WHITE,                # 6 조명
+    Colors.rgb(255, 192, 203),   # 7 조명 (분홍색)
+    Colors.rgb(0, 80, 0),        # 8 꺼진 조명
+    Colors.rgb(139, 69, 19),     # 9 줄기
+    Colors.BOLD + Colors.GREEN,  # 10 제목
+    Colors.RED + Colors.BOLD,    # 11 푸터 (Jingle Bells)
+    Colors.YELLOW + Colors.BOLD, # 12 푸터 (Merry Christmas)
+]
+# PALETTE와 같은 순서의 Rich 스타일 정의 (네이티브 Rich 렌더러용)
+PALETTE_RICH = [
+    'bright_green',
+    'rgb(34,139,34)',
+    'rgb(0,100,0)',
+    'bright_red',
+    'bright_yellow',
+    'bright_cyan',
+    'bright_white',
+    'rgb(255,192,203)',
+    'rgb(0,80,0)',
+    'rgb(139,69,19)',
+    'bold bright_green',
+    'bold bright_red',
+    'bold bright_yellow',
+]
+PAL_NONE = -1   # 색 없음 (공백 등)
+PAL_YELLOW = 4
+PAL_WHITE = 6
+PAL_LIGHT_OFF = 8
+PAL_TRUNK = 9
+PAL_TITLE = 10
+PAL_FOOTERS = (11, 12)
+LIGHT_PALETTE = (3, 4, 5, 6, 7)
+TREE_PALETTE = (0, 1, 2)
 
-    mode: 'single' (one big triangle) or 'double' (two stacked triangles)
-    density: 전구 밀도 (0-1)
-    max_width: 터미널 중앙 기준 너비
+# 행 종류
+ROW_TREE = 0
+ROW_TRUNK = 1
+ROW_STAR = 2
+ROW_EMPTY = 3
+
+_NP_DTYPES = {'B': 'uint8', 'b': 'int8', 'H': 'uint16', 'i': 'int32'}
+
+
+def load_rich() -> bool:
+    """Rich 모듈을 처음 부를 때 한 번만 불러옴 (설치되어 있으면 True)"""
+    global Console, Live, Text, Segment, Style, _rich_loaded
+    if _rich_loaded is None:
+        try:
+            from rich.console import Console
+            from rich.live import Live
+            from rich.text import Text
+            from rich.segment import Segment
+            from rich.style import Style
+            _rich_loaded = True
+        except Exception:
+            _rich_loaded = False
+    return _rich_loaded
+
+
+# 배열이 이 크기 이상일 때만 NumPy를 쓴다. 작은 트리는 array.array가 충분히 빠르고
+# NumPy import(~100 ms)가 첫 프레임을 늦추는 것이 더 크다
+NUMPY_MIN_SIZE = 20_000
+
+
+def load_numpy():
+    """NumPy 모듈 (처음 부를 때 한 번만 import, 없으면 None)"""
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+            _numpy = numpy
+        except Exception:
+            _numpy = None
+    return _numpy
+
+
+def numpy_for(size: int):
+    """size칸짜리 배열에 쓸 NumPy 모듈 (NUMPY_MIN_SIZE보다 작거나 NumPy가 없으면 None)"""
+    return load_numpy() if size >= NUMPY_MIN_SIZE else None
+
+
+# ANSI 색상 문자열 -> 팔레트 인덱스
+_PALETTE_INDEX = {color: i for i, color in enumerate(PALETTE)}
+
+
+def palette_index(color: str) -> int:
+    """ANSI 색상 문자열의 팔레트 인덱스 (없으면 팔레트에 추가)
+
+    Colors.rgb로 만든 색이면 PALETTE_RICH에도 같은 색의 Rich 스타일 이름을 넣는다.
+    """
+    index = _PALETTE_INDEX.get(color)
+    if index is None:
+        index = _PALETTE_INDEX[color] = len(PALETTE)
+        PALETTE.append(color)
+        PALETTE_RICH.append(_RGB_RICH.get(color))
+    return index
+
+
+_ANSI_CELLS = {}
+
+
+def ansi_cells(glyph: str) -> list:
+    """팔레트 인덱스 -> 색 escape + glyph + RESET 문자열 표 ('plain' 인코더가 셀마다 씀)
+
+    표는 글자마다 한 번 만들고 팔레트에 색이 추가되면 다시 만든다.
+    """
+    table = _ANSI_CELLS.get(glyph)
+    if table is None or len(table) != len(PALETTE):
+        table = _ANSI_CELLS[glyph] = [color + glyph + Colors.RESET for color in PALETTE]
+    return table
+
+
+def _alloc(typecode: str, n: int, fill: int = 0, np=None):
+    """np(NumPy 모듈)가 있으면 ndarray, 없으면 array.array로 n칸짜리 배열 생성"""
+    if np is not None:
+        return np.full(n, fill, dtype=_NP_DTYPES[typecode])
+    return array(typecode, [fill]) * n
+
+
+class TreeModel:
+    """트리 전체를 평행 배열로 저장하는 모델
+
+    행 배열(row_*)은 행마다 한 칸, 셀 배열은 트리 줄의 '*' 하나마다 한 칸이다.
+    색은 PALETTE 인덱스로만 저장한다. 빌드/해체 애니메이션이 다루는 '요소'는
+    셀 0..n_cells-1 뒤에 줄기/별 행(special_rows 순서)을 이어 붙인 번호 공간이다.
+
+    version은 visible이 바뀔 때마다 증가하고, row_version은 바뀐 행만 증가한다
+    (행 단위 렌더 캐시의 dirty 표시). 배열을 직접 고친 경우에는 touch()를
+    호출해야 캐시가 무효화된다.
+
+    np는 이 트리의 배열 백엔드다: 셀이 NUMPY_MIN_SIZE 이상이면 NumPy 모듈(ndarray),
+    아니면 None(array.array). 배열을 다루는 함수는 전역 대신 tree.np를 본다.
+    """
+
+    _uids = itertools.count()
+
+    __slots__ = ('uid', 'np', 'version', 'row_version', '_row_lines', '_effects', 'effect', 'layout_width', 'n_rows', 'n_cells', 'row_kind', 'row_padding', 'row_width',
+                 'row_start', 'row_color', 'row_visible', 'special_rows',
+                 'has_light', 'light_color', 'phase', 'tree_color', 'visible',
+                 'cell_row')
+
+    def __init__(self, rows):
+        """rows: (kind, padding, width, color) 튜플 목록. 셀 배열은 0으로 채워진다"""
+        self.uid = next(TreeModel._uids)
+        self.np = np = numpy_for(sum(width for kind, _, width, _ in rows if kind == ROW_TREE))
+        self.version = 0
+        self.n_rows = len(rows)
+        self.row_version = array('i', [0]) * self.n_rows
+        # 위상 버킷별 행 렌더 캐시: bucket -> (lines, 렌더 당시 row_version)
+        self._row_lines = {}
+        # 조명 효과 (None이면 DEFAULT_EFFECT)와 효과가 트리별로 미리 계산해 두는 값
+        self.effect = None
+        self._effects = {}
+        # 마지막으로 중앙 정렬한 폭 (relayout 참고)
+        self.layout_width = None
+        self.row_kind = _alloc('B', self.n_rows, np=np)
+        self.row_padding = _alloc('i', self.n_rows, np=np)
+        self.row_width = _alloc('i', self.n_rows, np=np)
+        self.row_start = _alloc('i', self.n_rows, np=np)
+        self.row_color = _alloc('B', self.n_rows, np=np)
+        self.row_visible = _alloc('B', self.n_rows, 1, np=np)
+        specials = []
+        n_cells = 0
+        for r, (kind, padding, width, color) in enumerate(rows):
+            self.row_kind[r] = kind
+            self.row_padding[r] = padding
+            self.row_width[r] = width
+            self.row_start[r] = n_cells
+            self.row_color[r] = color
+            if kind == ROW_TREE:
+                n_cells += width
+            elif kind in (ROW_TRUNK, ROW_STAR):
+                specials.append(r)
+        self.n_cells = n_cells
+        self.special_rows = array('i', specials)
+        self.has_light = _alloc('B', n_cells, np=np)
+        self.light_color = _alloc('B', n_cells, np=np)
+        self.phase = _alloc('B', n_cells, np=np)
+        self.tree_color = _alloc('B', n_cells, np=np)
+        self.visible = _alloc('B', n_cells, 1, np=np)
+        self.cell_row = _alloc('H', n_cells, np=np)
+        for r in range(self.n_rows):
+            if rows[r][0] == ROW_TREE:
+                s = self.row_start[r]
+                self.cell_row[s:s + self.row_width[r]] = _alloc('H', int(self.row_width[r]), r, np)
+
+    @property
+    def n_elements(self) -> int:
+        return self.n_cells + len(self.special_rows)
+
+    def element_row(self, idx: int) -> int:
+        """요소 번호가 속한 행 번호"""
+        if idx < self.n_cells:
+            return int(self.cell_row[idx])
+        return self.special_rows[idx - self.n_cells]
+
+    def touch(self, row: int | None = None):
+        """모델이 바뀌었음을 알림 (row가 None이면 모든 행의 캐시 무효화)"""
+        self.version += 1
+        if row is None:
+            self._row_lines.clear()
+            self._effects.clear()
+        else:
+            self.row_version[row] += 1
+
+    def set_visible(self, idx: int, flag: bool = True):
+        """요소 하나의 visible 플래그 변경 (해당 행만 dirty 표시)"""
+        if idx < self.n_cells:
+            self.visible[idx] = flag
+            row = int(self.cell_row[idx])
+        else:
+            row = self.special_rows[idx - self.n_cells]
+            self.row_visible[row] = flag
+        self.version += 1
+        self.row_version[row] += 1
+
+    def set_visible_many(self, indices, flag: bool = True):
+        """여러 요소의 visible 플래그를 한 번에 변경 (인덱스 배열 입력)"""
+        np = self.np
+        if np is not None and isinstance(indices, np.ndarray):
+            cells = indices[indices < self.n_cells]
+            self.visible[cells] = flag
+            for r in np.unique(self.cell_row[cells]).tolist():
+                self.row_version[r] += 1
+            for idx in indices[indices >= self.n_cells].tolist():
+                row = self.special_rows[idx - self.n_cells]
+                self.row_visible[row] = flag
+                self.row_version[row] += 1
+            self.version += 1
+        else:
+            for idx in indices:
+                self.set_visible(idx, flag)
+
+    def set_all_visible(self, flag: bool = True):
+        """모든 요소의 visible 플래그를 한 번에 변경"""
+        self.visible[:] = _alloc('B', self.n_cells, int(flag), self.np)
+        for r in self.special_rows:
+            self.row_visible[r] = flag
+        self.touch()
+
+    def set_effect(self, effect):
+        """조명 효과 변경 (Effect 인스턴스, None이면 기본 깜빡임). 모든 캐시를 무효화"""
+        self.effect = effect
+        self.touch()
+
+    def relayout(self, max_width: int) -> bool:
+        """max_width 기준으로 행의 padding(중앙 정렬)만 다시 계산
+
+        조명/색/위상과 행 너비는 그대로 둔다. padding이 바뀐 행만 dirty로 표시하므로
+        폭이 같으면 캐시가 그대로 유지된다. 바뀐 행이 있으면 True를 반환.
+        """
+        if max_width == self.layout_width:
+            return False
+        self.layout_width = max_width
+        changed = False
+        for r in range(self.n_rows):
+            if self.row_kind[r] == ROW_EMPTY:
+                continue
+            padding = max(0, (max_width - int(self.row_width[r])) // 2)
+            if padding != self.row_padding[r]:
+                self.row_padding[r] = padding
+                self.row_version[r] += 1
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def to_dicts(self):
+        """예전 create_tree_structure의 dict 목록 형식으로 변환 (호환용)"""
+        tree_data = []
+        for r in range(self.n_rows):
+            kind = self.row_kind[r]
+            padding = int(self.row_padding[r])
+            if kind == ROW_EMPTY:
+                tree_data.append({'padding': 0, 'chars': [], 'is_empty': True})
+            elif kind == ROW_TRUNK:
+                tree_data.append({'trunk': True, 'padding': padding, 'width': int(self.row_width[r]),
+                                  'color': PALETTE[self.row_color[r]],
+                                  'visible': bool(self.row_visible[r])})
+            elif kind == ROW_STAR:
+                tree_data.append({'star': True, 'padding': padding,
+                                  'visible': bool(self.row_visible[r])})
+            else:
+                s = int(self.row_start[r])
+                e = s + int(self.row_width[r])
+                chars = []
+                for lit, lc, ph, tc, vis in zip(self.has_light[s:e].tolist(), self.light_color[s:e].tolist(),
+                                                self.phase[s:e].tolist(), self.tree_color[s:e].tolist(),
+                                                self.visible[s:e].tolist()):
+                    chars.append({
+                        'has_light': bool(lit),
+                        'light_color': PALETTE[lc] if lit else None,
+                        'phase': ph,
+                        'tree_color': PALETTE[tc],
+                        'visible': bool(vis),
+                    })
+                tree_data.append({'padding': padding, 'chars': chars})
+        return tree_data
+
+    @classmethod
+    def from_dicts(cls, tree_data):
+        """예전 dict 목록 형식의 트리를 모델로 변환"""
+        rows = []
+        for row in tree_data:
+            if row.get('is_empty') or row.get('banner'):
+                rows.append((ROW_EMPTY, 0, 0, 0))
+            elif row.get('trunk'):
+                rows.append((ROW_TRUNK, row['padding'], row['width'], palette_index(row['color'])))
+            elif row.get('star'):
+                rows.append((ROW_STAR, row['padding'], 1, PAL_YELLOW))
+            else:
+                rows.append((ROW_TREE, row['padding'], len(row['chars']), 0))
+        model = cls(rows)
+        i = 0
+        for r, row in enumerate(tree_data):
+            if rows[r][0] in (ROW_TRUNK, ROW_STAR):
+                model.row_visible[r] = row.get('visible', True)
+            elif rows[r][0] == ROW_TREE:
+                for char_data in row['chars']:
+                    model.has_light[i] = bool(char_data['has_light'])
+                    if char_data['has_light']:
+                        model.light_color[i] = palette_index(char_data['light_color'])
+                    model.phase[i] = char_data.get('phase', 0)
+                    model.tree_color[i] = palette_index(char_data['tree_color'])
+                    model.visible[i] = char_data.get('visible', True)
+                    i += 1
+        return model
+
+
+# 4바이트 부호 없는 정수 array 타입코드
+_U32 = 'I' if array('I').itemsize == 4 else 'L'
+
+
+def _random_u32(rng, n: int, np=None):
+    """rng.getrandbits 한 번으로 32비트 난수 n개를 뽑아 배열로 반환 (np가 있으면 ndarray)
+
+    NumPy 배열이든 array.array든 같은 비트열에서 만들어지므로 값이 같다.
+    """
+    data = rng.getrandbits(32 * n).to_bytes(4 * n, 'little') if n else b''
+    if np is not None:
+        return np.frombuffer(data, dtype='<u4')
+    values = array(_U32)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+
+def _fill_lights(model, start: int, end: int, color: int, density: float, rng):
+    """셀 [start, end) 구간의 조명 여부, 조명 색, 위상을 한 번에 뽑아 채움
+
+    필드마다 32비트 난수를 한꺼번에 뽑는다: 조명은 u < density * 2^32,
+    색은 (u * 5) >> 32 번째 LIGHT_PALETTE, 위상은 u & 3.
+    """
+    n = end - start
+    if n <= 0:
+        return
+    threshold = min(max(int(density * 2 ** 32), 0), 2 ** 32)
+    np = model.np
+    lit_bits = _random_u32(rng, n, np)
+    color_bits = _random_u32(rng, n, np)
+    phase_bits = _random_u32(rng, n, np)
+    if np is not None:
+        lit = lit_bits < threshold
+        choice = (color_bits.astype(np.uint64) * len(LIGHT_PALETTE)) >> 32
+        model.has_light[start:end] = lit
+        model.light_color[start:end] = np.where(lit, np.asarray(LIGHT_PALETTE, dtype=np.uint8)[choice], 0)
+        model.phase[start:end] = phase_bits & 3
+        model.tree_color[start:end] = color
+        return
+    k = len(LIGHT_PALETTE)
+    lit = [u < threshold for u in lit_bits]
+    model.has_light[start:end] = array('B', lit)
+    model.light_color[start:end] = array('B', [LIGHT_PALETTE[(u * k) >> 32] if on else 0
+                                               for u, on in zip(color_bits, lit)])
+    model.phase[start:end] = array('B', [u & 3 for u in phase_bits])
+    model.tree_color[start:end] = array('B', [color]) * n
+
+
+# 프로세스 사이에 공유하는 모델 배열과 타입코드. visible/row_visible은 애니메이션 중에
+# 바뀌므로 공유 블록에는 초기값만 두고 워커마다 따로 복사해 쓴다.
+_SHARED_ARRAYS = (('row_kind', 'B'), ('row_padding', 'i'), ('row_width', 'i'), ('row_start', 'i'),
+                  ('row_color', 'B'), ('special_rows', 'i'), ('has_light', 'B'), ('light_color', 'B'),
+                  ('phase', 'B'), ('tree_color', 'B'), ('cell_row', 'H'), ('row_visible', 'B'), ('visible', 'B'))
+_PRIVATE_ARRAYS = ('row_visible', 'visible')
+
+
+def share_model(tree):
+    """모델 배열을 shared_memory 블록 하나에 올리고 (SharedMemory, layout)을 반환
+
+    layout은 attach_model에 넘기는 작은 dict라 워커에 보낼 때 배열을 복사하지 않는다.
+    블록은 호출한 쪽이 다 쓴 뒤 close()/unlink() 해야 한다.
+    """
+    from multiprocessing import shared_memory
+    arrays = {}
+    offset = 0
+    for name, typecode in _SHARED_ARRAYS:
+        n = len(getattr(tree, name))
+        arrays[name] = (typecode, offset, n)
+        # 다음 배열을 8바이트 경계에 맞춤
+        offset += (n * array(typecode).itemsize + 7) & ~7
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, (typecode, start, n) in arrays.items():
+        data = memoryview(getattr(tree, name)).cast('B')
+        shm.buf[start:start + len(data)] = data
+    layout = {'n_rows': tree.n_rows, 'n_cells': tree.n_cells, 'layout_width': tree.layout_width,
+              'numpy': tree.np is not None, 'arrays': arrays}
+    return shm, layout
+
+
+def attach_model(buf, layout):
+    """share_model로 만든 블록 위에 TreeModel을 만듦
+
+    공유 배열은 복사 없는 뷰(원래 트리가 NumPy면 frombuffer, 아니면 memoryview.cast)이고,
+    visible/row_visible만 이 프로세스 전용으로 복사한다.
+    """
+    model = TreeModel.__new__(TreeModel)
+    model.uid = next(TreeModel._uids)
+    model.np = np = load_numpy() if layout['numpy'] else None
+    model.version = 0
+    model.n_rows = layout['n_rows']
+    model.n_cells = layout['n_cells']
+    model.layout_width = layout['layout_width']
+    model.row_version = array('i', [0]) * model.n_rows
+    model._row_lines = {}
+    model._effects = {}
+    model.effect = None
+    for name, (typecode, start, n) in layout['arrays'].items():
+        view = buf[start:start + n * array(typecode).itemsize].cast(typecode)
+        if name in _PRIVATE_ARRAYS:
+            private = _alloc(typecode, n, np=np)
+            private[:] = np.asarray(view) if np is not None else array(typecode, view)
+            view = private
+        elif np is not None and name != 'special_rows':
+            view = np.frombuffer(buf, dtype=_NP_DTYPES[typecode], count=n, offset=start)
+        setattr(model, name, view)
+    return model
+
+
+def _light_data(tree):
+    """조명이 있는 셀의 (셀 번호, 조명 색, 위상) 배열 (트리별로 한 번만 계산)"""
+    data = tree._effects.get('lights')
+    if data is None:
+        np = tree.np
+        if np is not None:
+            cells = np.flatnonzero(np.asarray(tree.has_light))
+            data = (cells, np.asarray(tree.light_color)[cells], np.asarray(tree.phase)[cells])
+        else:
+            cells = array('i', [i for i, lit in enumerate(tree.has_light) if lit])
+            data = (cells, [tree.light_color[i] for i in cells], [tree.phase[i] for i in cells])
+        tree._effects['lights'] = data
+    return data
+
+
+class Effect:
+    """조명 효과: 한 프레임의 모든 조명 스타일을 한 번에 계산
+
+    styles(tree, frame)는 조명이 있는 셀(_light_data 순서)마다 팔레트 인덱스를 담은
+    배열을 반환한다. PAL_LIGHT_OFF는 꺼진 조명('*'), 그 밖의 값은 그 색으로 켜진
+    조명('●')이다. period는 출력이 되풀이되는 프레임 수로 캐시 키(frame % period)에
+    쓰이고, None이면 매 프레임 다르다고 보고 프레임 캐시를 쓰지 않는다.
+    트리별로 미리 계산할 값은 tree._effects[self]에 둔다 (set_effect/touch 때 지워짐).
+    배열 연산은 트리의 백엔드(tree.np)를 따른다.
+    """
+
+    period: int | None = None
+
+    def styles(self, tree, frame: int):
+        raise NotImplementedError
+
+    def _params(self, tree):
+        params = tree._effects.get(self)
+        if params is None:
+            params = tree._effects[self] = self.prepare(tree)
+        return params
+
+    def prepare(self, tree):
+        """트리별로 한 번 계산할 값 (styles에서 _params로 꺼냄)"""
+        return None
+
+
+class Blink(Effect):
+    """기본 깜빡임: (frame + phase) % 4 < 2 이면 켜짐"""
+
+    period = 4
+
+    def styles(self, tree, frame: int):
+        _, colors, phases = _light_data(tree)
+        f = frame % 4
+        np = tree.np
+        if np is not None:
+            return np.where(((phases + f) & 3) < 2, colors, PAL_LIGHT_OFF)
+        return [lc if (f + ph) & 3 < 2 else PAL_LIGHT_OFF for lc, ph in zip(colors, phases)]
+
+
+class DutyBlink(Effect):
+    """조명마다 주기(periods 중 하나)와 켜짐 비율(duty)이 다른 깜빡임"""
+
+    def __init__(self, periods=(4, 6, 8, 12), duty: float = 0.5, seed: int = 0):
+        self.periods = tuple(periods)
+        self.duty = duty
+        self.seed = seed
+        self.period = math.lcm(*self.periods)
+
+    def prepare(self, tree):
+        cells, _, phases = _light_data(tree)
+        np = tree.np
+        u = _random_u32(random.Random(self.seed), len(cells), np)
+        k = len(self.periods)
+        if np is not None:
+            period = np.asarray(self.periods, dtype=np.int32)[(u.astype(np.uint64) * k) >> 32]
+            on = np.maximum(1, np.rint(period * self.duty)).astype(np.int32)
+            return period, on, (phases.astype(np.int32) * period) // 4
+        period = [self.periods[(x * k) >> 32] for x in u]
+        on = [max(1, round(p * self.duty)) for p in period]
+        return period, on, [ph * p // 4 for ph, p in zip(phases, period)]
+
+    def styles(self, tree, frame: int):
+        _, colors, _ = _light_data(tree)
+        period, on, offset = self._params(tree)
+        f = frame % self.period
+        np = tree.np
+        if np is not None:
+            return np.where((offset + f) % period < on, colors, PAL_LIGHT_OFF)
+        return [lc if (o + f) % p < n else PAL_LIGHT_OFF for lc, p, n, o in zip(colors, period, on, offset)]
+
+
+class Chase(Effect):
+    """행을 따라 흘러가는 빛의 물결: spacing칸마다 width칸씩 켜지고 프레임마다 speed칸 이동"""
+
+    def __init__(self, spacing: int = 8, width: int = 3, speed: int = 1):
+        self.spacing = spacing
+        self.width = width
+        self.speed = speed
+        self.period = spacing // math.gcd(spacing, speed)
+
+    def prepare(self, tree):
+        # 행 가운데 기준 열 번호 (relayout으로 padding이 바뀌어도 그대로)
+        cells, _, _ = _light_data(tree)
+        np = tree.np
+        if np is not None:
+            rows = np.asarray(tree.cell_row)[cells]
+            center = np.asarray(tree.row_start)[rows] + np.asarray(tree.row_width)[rows] // 2
+            return (cells.astype(np.int64) - center) % self.spacing
+        cols = []
+        for i in cells:
+            r = tree.cell_row[i]
+            cols.append((i - tree.row_start[r] - tree.row_width[r] // 2) % self.spacing)
+        return cols
+
+    def styles(self, tree, frame: int):
+        _, colors, _ = _light_data(tree)
+        cols = self._params(tree)
+        shift = frame * self.speed % self.spacing
+        np = tree.np
+        if np is not None:
+            return np.where((cols - shift) % self.spacing < self.width, colors, PAL_LIGHT_OFF)
+        return [lc if (c - shift) % self.spacing < self.width else PAL_LIGHT_OFF for lc, c in zip(colors, cols)]
+
+
+# 조명 색의 RGB (Fade가 밝기 단계별 트루컬러를 만들 때 사용)
+LIGHT_RGB = {3: (255, 85, 85), 4: (255, 255, 85), 5: (85, 255, 255), 6: (255, 255, 255), 7: (255, 192, 203)}
+LIGHT_OFF_RGB = (0, 80, 0)
+
+
+class Fade(Effect):
+    """밝기가 코사인 곡선으로 천천히 오르내리는 조명
+
+    밝기는 levels 단계로 양자화하고, 단계마다 꺼진 색과 조명 색 사이의 Colors.rgb
+    팔레트 항목을 한 번만 만들어 (색, 단계) 표로 찾는다. 0단계는 꺼진 조명이다.
+    """
+
+    def __init__(self, period: int = 16, levels: int = 6):
+        self.period = period
+        self.levels = levels
+        self.wave = [round((levels - 1) * (0.5 - 0.5 * math.cos(2 * math.pi * k / period))) for k in range(period)]
+
+    def prepare(self, tree):
+        _, colors, phases = _light_data(tree)
+        n_colors = max([int(c) for c in colors] + [0]) + 1
+        table = []
+        for c in range(n_colors):
+            r, g, b = LIGHT_RGB.get(c, (255, 255, 255))
+            row = [PAL_LIGHT_OFF]
+            for level in range(1, self.levels):
+                a = level / (self.levels - 1)
+                row.append(palette_index(Colors.rgb(*(round(o + (x - o) * a) for o, x in zip(LIGHT_OFF_RGB, (r, g, b))))))
+            table.append(row)
+        np = tree.np
+        if np is not None:
+            offset = (phases.astype(np.int32) * self.period) // 4
+            return np.asarray(table, dtype=np.int16), np.asarray(self.wave, dtype=np.int16), offset
+        return table, self.wave, [ph * self.period // 4 for ph in phases]
+
+    def styles(self, tree, frame: int):
+        _, colors, _ = _light_data(tree)
+        table, wave, offset = self._params(tree)
+        f = frame % self.period
+        np = tree.np
+        if np is not None:
+            return table[colors, wave[(offset + f) % self.period]]
+        return [table[lc][wave[(o + f) % self.period]] for lc, o in zip(colors, offset)]
+
+
+class Sparkle(Effect):
+    """base 효과 위에 무작위로 흰 빛이 번쩍이는 조명 (매 프레임 달라서 period는 None)
+
+    조명 번호, 프레임, seed의 32비트 해시로 고르므로 NumPy 유무와 관계없이 같은
+    조명이 반짝인다.
+    """
+
+    period = None
+
+    def __init__(self, rate: float = 0.03, base: Effect | None = None, seed: int = 0):
+        self.rate = rate
+        self.base = base or Blink()
+        self.seed = seed
+
+    def styles(self, tree, frame: int):
+        base = self.base.styles(tree, frame)
+        threshold = int(self.rate * 2 ** 32)
+        salt = (frame * 0x85EBCA77 + self.seed * 0xC2B2AE3D) & 0xFFFFFFFF
+        mask = 0xFFFFFFFF
+        np = tree.np
+        if np is not None:
+            h = (np.arange(len(base), dtype=np.uint64) * 0x9E3779B1 ^ salt) & mask
+            h ^= h >> 16
+            h = (h * 0x7FEB352D) & mask
+            h ^= h >> 15
+            return np.where(h < threshold, PAL_WHITE, base)
+        out = []
+        for i, st in enumerate(base):
+            h = ((i * 0x9E3779B1) ^ salt) & mask
+            h ^= h >> 16
+            h = (h * 0x7FEB352D) & mask
+            h ^= h >> 15
+            out.append(PAL_WHITE if h < threshold else st)
+        return out
+
+
+DEFAULT_EFFECT = Blink()
+# --effect 이름 -> 효과 생성 함수 (seed를 받음)
+EFFECTS = {
+    'blink': lambda seed=None: Blink(),
+    'duty': lambda seed=None: DutyBlink(seed=seed or 0),
+    'chase': lambda seed=None: Chase(),
+    'fade': lambda seed=None: Fade(),
+    'sparkle': lambda seed=None: Sparkle(seed=seed or 0),
+}
+
+
+def make_effect(effect, seed: int | None = None):
+    """효과 이름(EFFECTS의 키)이나 Effect 인스턴스를 Effect로 변환"""
+    if isinstance(effect, str):
+        return EFFECTS[effect](seed)
+    return effect
+
+
+def effect_bucket(tree, frame: int):
+    """캐시 키로 쓸 프레임 버킷 (효과의 period로 나눈 나머지, 캐시하지 않으면 None)"""
+    period = (tree.effect or DEFAULT_EFFECT).period
+    return None if period is None else frame % period
+
+
+def light_styles(tree, frame: int):
+    """셀마다 조명 스타일(팔레트 인덱스)을 담은 배열 (조명 없는 셀의 값은 의미 없음)
+
+    같은 프레임 버킷은 한 번만 계산해 둔다.
+    """
+    effect = tree.effect or DEFAULT_EFFECT
+    key = frame if effect.period is None else frame % effect.period
+    cached = tree._effects.get('styles')
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    cells, _, _ = _light_data(tree)
+    values = effect.styles(tree, frame)
+    np = tree.np
+    if np is not None:
+        full = np.zeros(tree.n_cells, dtype=np.uint16)
+        full[cells] = values
+    else:
+        full = array('H', [0]) * tree.n_cells
+        for i, v in zip(cells, values):
+            full[i] = v
+    tree._effects['styles'] = (key, full)
+    return full
+
+
+def terminal_width(default: int = 50, resized: bool = False) -> int:
+    """현재 터미널 폭 (터미널이 아니면 COLUMNS 환경 변수나 default)
+
+    resized: SIGWINCH 뒤에 부를 때 True. shutil은 내보낸 COLUMNS를 먼저 보므로
+             창 크기가 바뀐 것을 놓친다. 이때는 stdout 터미널에 직접 묻는다.
     """
+    if resized:
+        try:
+            return os.get_terminal_size(sys.stdout.fileno()).columns
+        except (OSError, ValueError):
+            pass
+    import shutil
+    return shutil.get_terminal_size((default, 24)).columns
+
+
+def resolve_width(max_width) -> int:
+    """--width 값 해석: 'auto'이면 terminal_width(), 아니면 정수"""
+    if max_width == 'auto':
+        return terminal_width()
+    return int(max_width)
+
 
-    # 조명 색상
-    light_colors = [
-        Colors.RED,
-        Colors.YELLOW,
-        Colors.CYAN,
-        Colors.WHITE,
-        Colors.rgb(255, 192, 203),  # 분홍색
-    ]
+def create_tree_structure(mode: str = 'double', density: float = 0.25, max_width: int | str = 50, gap: int = 1, scale: int = 1, seed: int | None = None,
+                          effect=None):
+    """조명 위치를 미리 정한 크리스마스 트리 생성 (TreeModel 반환)
 
-    # 트리 색상 팔레트
-    colors = [Colors.GREEN, Colors.rgb(34, 139, 34), Colors.rgb(0, 100, 0)]
+    mode: 'single' (one big triangle) or 'double' (two stacked triangles)
+    density: 전구 밀도 (0-1)
+    max_width: 터미널 중앙 기준 너비 ('auto'이면 현재 터미널 폭, resolve_width 참고)
+    scale: 트리 크기 배율 (삼각형 밑변/높이와 줄기를 함께 키움)
+    seed: 조명 배치 시드. 같은 시드면 NumPy 유무와 관계없이 같은 트리가 나온다
+          (None이면 random 모듈의 전역 생성기를 사용)
+    effect: 조명 효과 (EFFECTS의 이름이나 Effect 인스턴스, None이면 기본 깜빡임)
+    """
 
-    tree_data = []
+    if scale < 1:
+        raise ValueError(f"scale must be a positive integer: {scale}")
+    max_width = resolve_width(max_width)
+    rows = []
+    triangles = []
 
     # (no top banner by default)
 
     def make_triangle(base_width, height, color):
+        triangles.append((len(rows), height, color))
         for row in range(1, height + 1):
             # 비례적으로 너비 결정
             current_width = max(1, (base_width * row) // height)
             if current_width % 2 == 0:
                 current_width -= 1
             padding = (max_width - current_width) // 2
-            row_data = {'padding': padding, 'chars': []}
-            for col in range(current_width):
-                has_light = random.random() < density
-                light_color = random.choice(light_colors) if has_light else None
-                row_data['chars'].append({
-                    'has_light': has_light,
-                    'light_color': light_color,
-                    'phase': random.randint(0, 3),
-                    'tree_color': color
-                })
-            tree_data.append(row_data)
+            rows.append((ROW_TREE, padding, current_width, color))
         # 빈 줄
-        # tree_data.append({'padding': 0, 'chars': [], 'is_empty': True})
+        # rows.append((ROW_EMPTY, 0, 0, 0))
 
     if mode == 'single':
         # 한개의 큰 삼각형
-        base = min(41, max_width - 2)
-        height = 20
-        make_triangle(base, height, colors[0])
+        base = min(41 * scale, max_width - 2)
+        height = 20 * scale
+        make_triangle(base, height, TREE_PALETTE[0])
     else:
         # 두 개의 삼각형 (작은 위쪽, 큰 아래쪽)
-        top_base = min(21, max_width - 10)
-        top_height = 10
-        bottom_base = min(41, max_width - 2)
-        bottom_height = 11
-        make_triangle(top_base, top_height, colors[0])
+        top_base = min(21 * scale, max_width - 10)
+        top_height = 10 * scale
+        bottom_base = min(41 * scale, max_width - 2)
+        bottom_height = 11 * scale
+        make_triangle(top_base, top_height, TREE_PALETTE[0])
         # # 중간 공백 추가 (gap 줄)
         # for _ in range(max(0, gap)):
-        #     tree_data.append({'padding': 0, 'chars': [], 'is_empty': True})
-        make_triangle(bottom_base, bottom_height, colors[1])
+        #     rows.append((ROW_EMPTY, 0, 0, 0))
+        make_triangle(bottom_base, bottom_height, TREE_PALETTE[1])
 
     # 트리 줄기
-    trunk_width = max(1, base // 13) if mode == 'single' else 3
+    trunk_width = max(1, base // 13) if mode == 'single' else 2 * scale + 1
     trunk_padding = (max_width - trunk_width) // 2
-    trunk_color = Colors.rgb(139, 69, 19)
-    for _ in range(4):
-        tree_data.append({'trunk': True, 'padding': trunk_padding, 'width': trunk_width, 'color': trunk_color})
+    for _ in range(4 * scale):
+        rows.append((ROW_TRUNK, trunk_padding, trunk_width, PAL_TRUNK))
 
     # 별
     star_padding = (max_width - 1) // 2
-    tree_data.append({'star': True, 'padding': star_padding})
+    rows.append((ROW_STAR, star_padding, 1, PAL_YELLOW))
 
-    return tree_data
+    model = TreeModel(rows)
+    model.layout_width = max_width
 
-def print_tree_with_lights(tree_data, animation_frame: int):
-    """조명 위치가 고정된 크리스마스 트리 출력"""
-    
-    light_colors = [
-        Colors.RED,
-        Colors.YELLOW,
-        Colors.CYAN,
-        Colors.WHITE,
-        Colors.rgb(255, 192, 203),  # 분홍색
-    ]
-    
-    output = []
-    
-    for row_data in tree_data:
-        # 배너(큰 별 등) 라인
-        if row_data.get('banner'):
-            output.append(row_data['text'])
-            continue
-        # 빈 줄
-        if row_data.get('is_empty'):
-            output.append('')
-        # 줄기
-        elif row_data.get('trunk'):
-            line = ' ' * row_data['padding']
-            if row_data.get('visible', True):
-                line += row_data['color'] + '*' * row_data['width'] + Colors.RESET
+    # 조명 배치: 삼각형마다 조명 여부, 조명 색, 깜빡임 위상을 한 번에 뽑는다
+    rng = random if seed is None else random.Random(seed)
+    for first_row, height, color in triangles:
+        last_row = first_row + height - 1
+        start = int(model.row_start[first_row])
+        end = int(model.row_start[last_row]) + int(model.row_width[last_row])
+        _fill_lights(model, start, end, color, density, rng)
+
+    if effect is not None:
+        model.effect = make_effect(effect, seed)
+    return model
+
+def _render_row(tree, r: int, animation_frame: int) -> str:
+    """트리의 한 행을 ANSI 문자열로 렌더 ('plain' 인코더: 셀마다 색 + 글자 + RESET)"""
+    reset = Colors.RESET
+    kind = tree.row_kind[r]
+    line = ' ' * int(tree.row_padding[r])
+    # 빈 줄
+    if kind == ROW_EMPTY:
+        return ''
+    # 줄기
+    if kind == ROW_TRUNK:
+        if tree.row_visible[r]:
+            return line + PALETTE[tree.row_color[r]] + '*' * int(tree.row_width[r]) + reset
+        return line + ' ' * int(tree.row_width[r])
+    # 별
+    if kind == ROW_STAR:
+        if tree.row_visible[r]:
+            return line + Colors.YELLOW + '✨' + reset
+        return line + ' '
+    # 트리 줄
+    s = int(tree.row_start[r])
+    e = s + int(tree.row_width[r])
+    parts = [line]
+    # 조명 상태는 효과(tree.effect)가 프레임마다 계산한다 (기본: per-light phase로 불규칙하게 깜빡임)
+    styles = light_styles(tree, animation_frame)
+    # 셀 문자열은 팔레트 표에서 꺼낸다 (효과가 팔레트에 색을 더할 수 있으므로 light_styles 뒤에)
+    bulbs = ansi_cells('●')
+    stars = ansi_cells('*')
+    for vis, lit, st, tc in zip(tree.visible[s:e].tolist(), tree.has_light[s:e].tolist(),
+                                styles[s:e].tolist(), tree.tree_color[s:e].tolist()):
+        if not vis:
+            # 아직 빌드되지 않은 위치
+            parts.append(' ')
+        elif lit:
+            if st != PAL_LIGHT_OFF:
+                # 켜진 상태는 더 눈에 띄게 '●' 사용
+                parts.append(bulbs[st])
             else:
-                line += ' ' * row_data['width']
-            output.append(line)
-        # 별
-        elif row_data.get('star'):
-            line = ' ' * row_data['padding']
-            if row_data.get('visible', True):
-                line += Colors.YELLOW + '✨' + Colors.RESET
+                # 꺼진 상태는 어두운 초록색 '*' 사용
+                parts.append(stars[PAL_LIGHT_OFF])
+        else:
+            # 일반 트리 별
+            parts.append(stars[tc])
+    return ''.join(parts)
+
+
+def _render_row_rle(tree, r: int, animation_frame: int) -> str:
+    """트리의 한 행을 ANSI 문자열로 렌더 ('rle' 인코더)
+
+    같은 색 셀이 이어지는 구간마다 escape를 한 번만 쓰고 구간 끝에서만 RESET한다.
+    escape 문자열은 PALETTE에 미리 만들어 둔 것을 그대로 쓴다.
+    """
+    kind = tree.row_kind[r]
+    if kind != ROW_TREE:
+        # 줄기/별/빈 줄은 이미 한 구간짜리라 두 인코더의 출력이 같다
+        return _render_row(tree, r, animation_frame)
+    reset = Colors.RESET
+    palette = PALETTE
+    s = int(tree.row_start[r])
+    e = s + int(tree.row_width[r])
+    parts = [' ' * int(tree.row_padding[r])]
+    append = parts.append
+    current = PAL_NONE
+    styles = light_styles(tree, animation_frame)
+    for vis, lit, st, tc in zip(tree.visible[s:e].tolist(), tree.has_light[s:e].tolist(),
+                                styles[s:e].tolist(), tree.tree_color[s:e].tolist()):
+        if not vis:
+            style, glyph = PAL_NONE, ' '
+        elif lit:
+            style, glyph = st, ('*' if st == PAL_LIGHT_OFF else '●')
+        else:
+            style, glyph = tc, '*'
+        if style != current:
+            if current != PAL_NONE:
+                append(reset)
+            if style != PAL_NONE:
+                append(palette[style])
+            current = style
+        append(glyph)
+    if current != PAL_NONE:
+        append(reset)
+    return ''.join(parts)
+
+
+# 행 인코더: 'plain'은 셀마다 escape, 'rle'는 같은 색 구간마다 escape
+ENCODERS = {
+    'plain': _render_row,
+    'rle': _render_row_rle,
+}
+
+
+def _render_row_cells(tree, r: int, animation_frame: int) -> tuple:
+    """트리의 한 행을 (글자, 팔레트 인덱스) 셀 튜플로 렌더 (패딩 공백 포함)"""
+    kind = tree.row_kind[r]
+    if kind == ROW_EMPTY:
+        return ()
+    cells = [(' ', PAL_NONE)] * int(tree.row_padding[r])
+    if kind == ROW_TRUNK:
+        if tree.row_visible[r]:
+            cells += [('*', int(tree.row_color[r]))] * int(tree.row_width[r])
+        else:
+            cells += [(' ', PAL_NONE)] * int(tree.row_width[r])
+    elif kind == ROW_STAR:
+        cells.append(('✨', PAL_YELLOW) if tree.row_visible[r] else (' ', PAL_NONE))
+    else:
+        s = int(tree.row_start[r])
+        e = s + int(tree.row_width[r])
+        styles = light_styles(tree, animation_frame)
+        for vis, lit, st, tc in zip(tree.visible[s:e].tolist(), tree.has_light[s:e].tolist(),
+                                    styles[s:e].tolist(), tree.tree_color[s:e].tolist()):
+            if not vis:
+                cells.append((' ', PAL_NONE))
+            elif lit:
+                cells.append(('*', PAL_LIGHT_OFF) if st == PAL_LIGHT_OFF else ('●', st))
             else:
-                line += ' '
-            output.append(line)
-        # 트리 줄
+                cells.append(('*', tc))
+    return tuple(cells)
+
+
+def _cached_rows(tree, kind: str, animation_frame: int, render_row) -> list:
+    """위상 버킷별 행 캐시에서 행 목록을 꺼냄 (row_version이 바뀐 행만 다시 렌더)
+
+    효과에 period가 없으면 버킷 대신 'live' 칸 하나를 두고, 직전에 그린 프레임과
+    조명 스타일이 달라진 행도 함께 다시 렌더한다.
+    """
+    bucket = effect_bucket(tree, animation_frame)
+    key = (kind, 'live' if bucket is None else bucket)
+    versions = tree.row_version
+    cached = tree._row_lines.get(key)
+    if cached is None:
+        seen = array('i', versions)
+        rows = [render_row(tree, r, animation_frame) for r in range(tree.n_rows)]
+        snapshot = None if bucket is not None else _copy_styles(light_styles(tree, animation_frame))
+        tree._row_lines[key] = (rows, seen, snapshot)
+        return rows
+    rows, seen, snapshot = cached
+    if snapshot is not None:
+        styles = light_styles(tree, animation_frame)
+        for r in _style_changed_rows(tree, snapshot, styles):
+            # 조명만 바뀐 행: 버전을 어긋나게 해서 아래에서 다시 렌더
+            seen[r] = -1
+        snapshot[:] = styles
+    if seen != versions:
+        for r in range(tree.n_rows):
+            # 렌더 전에 버전을 읽어 둔다 (Live 갱신 스레드와 동시에 바뀌어도 다음에 다시 렌더됨)
+            v = versions[r]
+            if seen[r] != v:
+                rows[r] = render_row(tree, r, animation_frame)
+                seen[r] = v
+    return rows
+
+
+def _copy_styles(styles):
+    return array('H', styles) if isinstance(styles, array) else styles.copy()
+
+
+def _style_changed_rows(tree, old, new) -> list:
+    """조명 스타일 배열 두 개를 비교해 달라진 셀이 있는 행 번호 목록을 반환"""
+    np = tree.np
+    if np is not None:
+        changed = np.flatnonzero(old != new)
+        return np.unique(np.asarray(tree.cell_row)[changed]).tolist()
+    rows = set()
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            rows.add(tree.cell_row[i])
+    return sorted(rows)
+
+
+def render_lines(tree, animation_frame: int, encoder: str = 'rle') -> list:
+    """행별 ANSI 문자열 목록 (dirty 행만 다시 렌더하고 나머지는 캐시 재사용)"""
+    return _cached_rows(tree, 'ansi-' + encoder, animation_frame, ENCODERS[encoder])
+
+
+def render_row_cells(tree, animation_frame: int) -> list:
+    """행별 셀 튜플 목록 (render_lines와 같은 캐시 규칙)"""
+    return _cached_rows(tree, 'cells', animation_frame, _render_row_cells)
+
+
+def snow_field(tree) -> tuple:
+    """눈이 내리는 영역의 (폭, 높이): 트리 행 전체, 폭은 레이아웃 폭과 가장 긴 행 중 큰 값"""
+    width = tree.layout_width or 1
+    for r in range(tree.n_rows):
+        w = int(tree.row_padding[r]) + int(tree.row_width[r]) + (1 if tree.row_kind[r] == ROW_STAR else 0)
+        width = max(width, w)
+    return width, tree.n_rows
+
+
+# 눈 입자 셀: 느린(먼) 눈부터 빠른(가까운) 눈 순서
+SNOW_CELLS = (('·', PAL_WHITE), ('•', PAL_WHITE), ('❄', PAL_WHITE))
+
+
+class Snowfall:
+    """트리 위에 겹쳐 그리는 눈 입자 층
+
+    입자마다 위치(x, y), 속도(vx, vy), 글자 번호를 평행 배열에 두고 step()에서 배열
+    연산 한 번으로 모두 움직인다 (입자가 적거나 NumPy가 없으면 array.array와 루프). 바닥을 지난
+    입자는 맨 위의 무작위 열에서 다시 떨어진다. 속도 단위는 초당 칸 수이고 wind는
+    모든 입자에 더해지는 가로 속도다.
+
+    overlay는 마지막 step()의 결과로, 눈이 있는 행 -> (열 목록, 셀 목록) dict이다.
+    step()마다 새 dict로 바뀌므로 렌더러블이 붙잡고 있어도 안전하다.
+    """
+
+    MIN_SPEED = 3.0
+    MAX_SPEED = 12.0
+    DRIFT = 1.5
+    # 입자가 이만큼 이상이면 NumPy를 쓴다 (입자 하나를 루프로 옮기는 비용이 트리 셀보다 크다)
+    NUMPY_MIN_COUNT = 2000
+
+    def __init__(self, count: int, width: int, height: int, wind: float = 0.0, seed: int | None = None):
+        self.count = count
+        self.width = max(1, width)
+        self.height = max(1, height)
+        self.wind = wind
+        self.overlay = {}
+        self.np = np = load_numpy() if count >= self.NUMPY_MIN_COUNT else None
+        if np is not None:
+            self._rng = np.random.default_rng(seed)
+            # 격자 값(글자 번호 + 1) -> 셀 튜플
+            self._cell_lookup = np.empty(len(SNOW_CELLS) + 1, dtype=object)
+            for i, cell in enumerate(SNOW_CELLS):
+                self._cell_lookup[i + 1] = cell
+            rand = self._rng.random
+            self.x = (rand(count) * self.width).astype(np.float32)
+            self.y = (rand(count) * self.height).astype(np.float32)
+            self.vx = ((rand(count) * 2 - 1) * self.DRIFT).astype(np.float32)
+            self.vy = (self.MIN_SPEED + rand(count) * (self.MAX_SPEED - self.MIN_SPEED)).astype(np.float32)
+            glyph = (self.vy - self.MIN_SPEED) * (len(SNOW_CELLS) / (self.MAX_SPEED - self.MIN_SPEED))
+            self.glyph = np.minimum(glyph, len(SNOW_CELLS) - 1).astype(np.uint8)
         else:
-            line = ' ' * row_data['padding']
-            
-            for char_data in row_data['chars']:
-                if not char_data.get('visible', True):
-                    # 아직 빌드되지 않은 위치
-                    line += ' '
-                    continue
+            self._rng = random.Random(seed)
+            rand = self._rng.random
+            self.x = array('f', [rand() * self.width for _ in range(count)])
+            self.y = array('f', [rand() * self.height for _ in range(count)])
+            self.vx = array('f', [(rand() * 2 - 1) * self.DRIFT for _ in range(count)])
+            self.vy = array('f', [self.MIN_SPEED + rand() * (self.MAX_SPEED - self.MIN_SPEED) for _ in range(count)])
+            scale = len(SNOW_CELLS) / (self.MAX_SPEED - self.MIN_SPEED)
+            self.glyph = array('B', [min(int((v - self.MIN_SPEED) * scale), len(SNOW_CELLS) - 1) for v in self.vy])
+        self._occupied = None if np is None else np.zeros(self.width * self.height, dtype=np.uint8)
+        self._update_overlay()
 
-                if char_data['has_light']:
-                    # 깜빡임 효과: per-light phase를 더해 불규칙하게 깜빡임
-                    if (animation_frame + char_data.get('phase', 0)) % 4 < 2:
-                        # 켜진 상태는 더 눈에 띄게 '●' 사용
-                        line += char_data['light_color'] + '●' + Colors.RESET
-                    else:
-                        # 꺼진 상태는 어두운 초록색 '*' 사용
-                        line += Colors.rgb(0, 80, 0) + '*' + Colors.RESET
+    def resize(self, width: int, height: int):
+        """영역 크기 변경 (입자의 상대 위치는 유지)"""
+        width, height = max(1, width), max(1, height)
+        if (width, height) == (self.width, self.height):
+            return
+        sx, sy = width / self.width, height / self.height
+        np = self.np
+        if np is not None:
+            self.x *= sx
+            self.y *= sy
+        else:
+            for i in range(self.count):
+                self.x[i] *= sx
+                self.y[i] *= sy
+        self.width, self.height = width, height
+        if np is not None:
+            self._occupied = np.zeros(width * height, dtype=np.uint8)
+        self._update_overlay()
+
+    def step(self, dt: float):
+        """dt초만큼 모든 입자를 움직이고 overlay를 갱신"""
+        w, h = self.width, self.height
+        np = self.np
+        if np is not None:
+            self.x += (self.vx + self.wind) * dt
+            self.y += self.vy * dt
+            fallen = self.y >= h
+            n = int(np.count_nonzero(fallen))
+            if n:
+                self.y[fallen] %= h
+                self.x[fallen] = self._rng.random(n) * w
+            np.mod(self.x, w, out=self.x)
+        else:
+            rand = self._rng.random
+            wind = self.wind
+            x, y, vx, vy = self.x, self.y, self.vx, self.vy
+            for i in range(self.count):
+                yi = y[i] + vy[i] * dt
+                if yi >= h:
+                    y[i] = yi % h
+                    x[i] = rand() * w
                 else:
-                    # 일반 트리 별
-                    line += char_data['tree_color'] + '*' + Colors.RESET
-            
-            output.append(line)
-    
-    return '\n'.join(output)
+                    y[i] = yi
+                    x[i] = (x[i] + (vx[i] + wind) * dt) % w
+        self._update_overlay()
 
-def render_tree_rich(tree_data, animation_frame: int):
-    """Rich용 렌더러: ANSI 문자열을 Text로 변환해 반환"""
-    ansi_str = print_tree_with_lights(tree_data, animation_frame)
-    if Text is not None:
-        return Text.from_ansi(ansi_str)
-    # fallback
-    return ansi_str
+    def _update_overlay(self):
+        # 입자를 셀 격자에 찍는다 (한 칸에 여럿이면 나중 입자의 글자). 격자 번호 순서라 행/열로 정렬된다
+        w, h = self.width, self.height
+        overlay = {}
+        np = self.np
+        if np is not None:
+            occupied = self._occupied
+            occupied.fill(0)
+            cols = self.x.astype(np.int32)
+            rows = self.y.astype(np.int32)
+            ok = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h)
+            occupied[rows[ok] * w + cols[ok]] = self.glyph[ok] + 1
+            cells = np.flatnonzero(occupied)
+            if len(cells):
+                rows, cols = np.divmod(cells, w)
+                marks = self._cell_lookup[occupied[cells]].tolist()
+                starts = np.flatnonzero(np.diff(rows, prepend=-1)).tolist() + [len(cells)]
+                rows, cols = rows.tolist(), cols.tolist()
+                for a, b in zip(starts, starts[1:]):
+                    overlay[rows[a]] = (cols[a:b], marks[a:b])
+        else:
+            occupied = {}
+            for x, y, g in zip(self.x, self.y, self.glyph):
+                c, r = int(x), int(y)
+                if 0 <= c < w and 0 <= r < h:
+                    occupied[r * w + c] = g
+            for cell in sorted(occupied):
+                r, c = divmod(cell, w)
+                cols, marks = overlay.setdefault(r, ([], []))
+                cols.append(c)
+                marks.append(SNOW_CELLS[occupied[cell]])
+        self.overlay = overlay
 
-def render_full_rich(tree_data, animation_frame: int):
-    """제목, 트리, 푸터를 합쳐서 하나의 Text로 반환"""
-    title = f"{Colors.BOLD}{Colors.GREEN}🎄 Merry Christmas! 🎄{Colors.RESET}\n\n"
-    footer = (f"{Colors.RED}{Colors.BOLD}✨ Jingle Bells! ✨{Colors.RESET}"
-              if (animation_frame % 4) < 2
-              else f"{Colors.YELLOW}{Colors.BOLD}⭐ Merry Christmas! ⭐{Colors.RESET}")
 
-    ansi_str = title + print_tree_with_lights(tree_data, animation_frame) + "\n\n" + footer
-    if Text is not None:
-        return Text.from_ansi(ansi_str)
-    return ansi_str
+_BLANK_CELL = (' ', PAL_NONE)
 
-def animate_tree(duration: int = 60, mode: str = 'double', density: float = 0.25, speed: float = 0.5, max_width: int = 50, build: bool = False, build_speed: float = 0.02, auto_twinkle: bool = False, gap: int = 1, build_mode: str = 'sequential', seed: int | None = None, teardown: bool = False, teardown_speed: float = 0.02, teardown_mode: str = 'random'):
-    """크리스마스 트리 애니메이션"""
-    try:
-        # 한 번만 트리 구조 생성
-        tree_data = create_tree_structure(mode=mode, density=density, max_width=max_width, gap=gap)
 
-        # 빌드 애니메이션을 위해 모든 요소의 visible 플래그 초기화
-        for row in tree_data:
-            if row.get('chars') is not None:
-                for c in row['chars']:
-                    c['visible'] = not build
-            if row.get('trunk'):
-                row['visible'] = not build
-            if row.get('star'):
-                row['visible'] = not build
-
-        start_time = time.time()
-        frame = 0
-        # 음악 파일 경로 (하드코딩)
-        MUSIC_PATH = '/Users/seungmin/Desktop/tree/Santa-/JINGLE_BELLS .mp3'
-        music_proc = None
-        # 자동 재생 (macOS에서는 afplay 사용)
-        try:
-            if os.path.exists(MUSIC_PATH):
-                if platform.system() == 'Darwin':
-                    music_proc = subprocess.Popen(['afplay', MUSIC_PATH])
-                else:
-                    # Linux/other: try ffplay
-                    music_proc = subprocess.Popen(['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet', MUSIC_PATH])
-        except Exception as e:
-            print(f"Warning: could not start music: {e}")
-
-        # Rich가 설치되어 있으면 Live 업데이트로 한 번만 그린 뒤 내부만 업데이트
-        if Console is not None and Live is not None and Text is not None:
-            console = Console()
-            # 초기 렌더
-            with Live(render_full_rich(tree_data, 0), console=console, refresh_per_second=24) as live:
-                # 빌드 애니메이션: 차례대로 visible 켜기
-                if build:
-                    char_positions = []
-                    for r_idx, row in enumerate(tree_data):
-                        if row.get('chars'):
-                            for c_idx, _ in enumerate(row['chars']):
-                                char_positions.append((r_idx, c_idx))
-
-                    # shuffle character positions if requested
-                    if build_mode == 'random':
-                        if seed is not None:
-                            random.seed(seed)
-                            random.shuffle(char_positions)
-                        elif np is not None:
-                            char_positions = list(np.random.permutation(char_positions))
-                        else:
-                            random.shuffle(char_positions)
-
-                    positions = [('char', r, c) for (r, c) in char_positions]
-
-                    # append trunk and star last
-                    for r_idx, row in enumerate(tree_data):
-                        if row.get('trunk'):
-                            positions.append(('trunk', r_idx))
-                    for r_idx, row in enumerate(tree_data):
-                        if row.get('star'):
-                            positions.append(('star', r_idx))
-
-                    for pos in positions:
-                        if pos[0] == 'char':
-                            _, r_idx, c_idx = pos
-                            tree_data[r_idx]['chars'][c_idx]['visible'] = True
-                        elif pos[0] == 'trunk':
-                            _, r_idx = pos
-                            tree_data[r_idx]['visible'] = True
-                        elif pos[0] == 'star':
-                            _, r_idx = pos
-                            tree_data[r_idx]['visible'] = True
-
-                        live.update(render_full_rich(tree_data, 0))
-                        time.sleep(build_speed)
-                # 빌드 이후에 자동으로 반짝일지 결정
-                twinkle_enabled = (not build) or auto_twinkle
-
-                while time.time() - start_time < duration:
-                    # 깜빡임을 반영한 렌더 업데이트 (제목+트리+푸터를 한 번에 업데이트)
-                    # 빌드가 완료되고 auto_twinkle이 False이면 고정된 프레임(0)을 사용
-                    frame_for_render = frame if twinkle_enabled else 0
-                    live.update(render_full_rich(tree_data, frame_for_render))
-
-                    frame += 1
-                    time.sleep(speed)
-
-                # teardown phase: remove lights/trunk/star in order
-                if teardown:
-                    # collect all removable positions
-                    positions = []
-                    for r_idx, row in enumerate(tree_data):
-                        if row.get('chars'):
-                            for c_idx, _ in enumerate(row['chars']):
-                                positions.append(('char', r_idx, c_idx))
-                        if row.get('trunk'):
-                            positions.append(('trunk', r_idx))
-                        if row.get('star'):
-                            positions.append(('star', r_idx))
-
-                    if teardown_mode == 'random':
-                        if seed is not None:
-                            random.seed(seed)
-                            random.shuffle(positions)
-                        elif np is not None:
-                            positions = list(np.random.permutation(positions))
-                        else:
-                            random.shuffle(positions)
-                    else:
-                        # reverse order: remove from bottom to top
-                        positions = list(reversed(positions))
-
-                    for pos in positions:
-                        if pos[0] == 'char':
-                            _, r_idx, c_idx = pos
-                            tree_data[r_idx]['chars'][c_idx]['visible'] = False
-                        elif pos[0] == 'trunk':
-                            _, r_idx = pos
-                            tree_data[r_idx]['visible'] = False
-                        elif pos[0] == 'star':
-                            _, r_idx = pos
-                            tree_data[r_idx]['visible'] = False
-
-                        live.update(render_full_rich(tree_data, 0))
-                        time.sleep(teardown_speed)
-
-                    # final message
-                    msg = f"\n{Colors.BOLD}{Colors.GREEN}🎄 Happy Solo Christmas 🎄{Colors.RESET}\n"
-                    if Text is not None:
-                        live.update(Text.from_ansi(msg))
-                    else:
-                        live.update(msg)
-                    time.sleep(2.0)
-                    # stop music if playing
-                    try:
-                        if music_proc is not None and hasattr(music_proc, 'terminate'):
-                            music_proc.terminate()
-                            music_proc.wait(timeout=1)
-                    except Exception:
-                        pass
+def _snow_row(tree, r: int, cells, snow) -> tuple:
+    """한 행의 셀 튜플 위에 눈((열 목록, 셀 목록))을 겹친 새 셀 튜플 (켜진 조명과 별은 가리지 않음)"""
+    out = list(cells)
+    n = len(out)
+    # 별('✨')은 두 칸을 차지하므로 그 뒤의 열은 셀 번호가 하나 작다
+    wide = int(tree.row_padding[r]) if tree.row_kind[r] == ROW_STAR and tree.row_visible[r] else None
+    for col, cell in zip(*snow):
+        i = col
+        if wide is not None and col >= wide:
+            if col <= wide + 1:
+                continue
+            i = col - 1
+        if i >= n:
+            out += [_BLANK_CELL] * (i - n + 1)
+            n = i + 1
+        elif out[i][0] == '●':
+            continue
+        out[i] = cell
+    return tuple(out)
+
+
+def composite_snow(tree, rows, overlay) -> list:
+    """행별 셀 튜플 목록에 눈 overlay를 겹친 목록 (눈이 없는 행은 캐시된 튜플 그대로)"""
+    if not overlay:
+        return rows
+    rows = list(rows)
+    for r, marks in overlay.items():
+        if r < len(rows):
+            rows[r] = _snow_row(tree, r, rows[r], marks)
+    return rows
+
+
+_RICH_STYLES = {}
+
+
+def rich_style(style: int):
+    """팔레트 인덱스에 해당하는 Rich Style (한 번 만든 객체를 재사용)"""
+    cached = _RICH_STYLES.get(style)
+    if cached is None:
+        load_rich()
+        if style == PAL_NONE:
+            cached = Style.null()
+        elif PALETTE_RICH[style] is not None:
+            cached = Style.parse(PALETTE_RICH[style])
         else:
-            # Rich가 없으면 기존 방식(fallback)
-            # 빌드 애니메이션 (폴백)
-            if build:
-                char_positions = []
-                for r_idx, row in enumerate(tree_data):
-                    if row.get('chars'):
-                        for c_idx, _ in enumerate(row['chars']):
-                            char_positions.append((r_idx, c_idx))
-
-                if build_mode == 'random':
-                    if seed is not None:
-                        random.seed(seed)
-                        random.shuffle(char_positions)
-                    elif np is not None:
-                        char_positions = list(np.random.permutation(char_positions))
-                    else:
-                        random.shuffle(char_positions)
-
-                positions = [('char', r, c) for (r, c) in char_positions]
-                for r_idx, row in enumerate(tree_data):
-                    if row.get('trunk'):
-                        positions.append(('trunk', r_idx))
-                for r_idx, row in enumerate(tree_data):
-                    if row.get('star'):
-                        positions.append(('star', r_idx))
-
-                for pos in positions:
-                    if pos[0] == 'char':
-                        _, r_idx, c_idx = pos
-                        tree_data[r_idx]['chars'][c_idx]['visible'] = True
-                    elif pos[0] == 'trunk':
-                        _, r_idx = pos
-                        tree_data[r_idx]['visible'] = True
-                    elif pos[0] == 'star':
-                        _, r_idx = pos
-                        tree_data[r_idx]['visible'] = True
+            # Colors.rgb가 아닌 escape로 나중에 추가된 색은 ANSI escape에서 스타일을 얻는다
+            text = Text.from_ansi(PALETTE[style] + '*' + Colors.RESET)
+            cached = text.spans[0].style if text.spans else Style.null()
+        _RICH_STYLES[style] = cached
+    return cached
 
-                    clear_screen()
-                    title = f"{Colors.BOLD}{Colors.GREEN}🎄 Merry Christmas! 🎄{Colors.RESET}"
-                    print(title)
-                    print()
-                    print(print_tree_with_lights(tree_data, 0))
-                    time.sleep(build_speed)
-
-            # teardown phase (fallback)
-            if teardown:
-                positions = []
-                for r_idx, row in enumerate(tree_data):
-                    if row.get('chars'):
-                        for c_idx, _ in enumerate(row['chars']):
-                            positions.append(('char', r_idx, c_idx))
-                    if row.get('trunk'):
-                        positions.append(('trunk', r_idx))
-                    if row.get('star'):
-                        positions.append(('star', r_idx))
-
-                if teardown_mode == 'random':
-                    if seed is not None:
-                        random.seed(seed)
-                        random.shuffle(positions)
-                    elif np is not None:
-                        positions = list(np.random.permutation(positions))
-                    else:
-                        random.shuffle(positions)
-                else:
-                    positions = list(reversed(positions))
-
-                for pos in positions:
-                    if pos[0] == 'char':
-                        _, r_idx, c_idx = pos
-                        tree_data[r_idx]['chars'][c_idx]['visible'] = False
-                    elif pos[0] == 'trunk':
-                        _, r_idx = pos
-                        tree_data[r_idx]['visible'] = False
-                    elif pos[0] == 'star':
-                        _, r_idx = pos
-                        tree_data[r_idx]['visible'] = False
 
-                    clear_screen()
-                    title = f"{Colors.BOLD}{Colors.GREEN}🎄 Merry Christmas! 🎄{Colors.RESET}"
-                    print(title)
-                    print()
-                    print(print_tree_with_lights(tree_data, 0))
-                    time.sleep(teardown_speed)
-
-                # final message (fallback)
-                clear_screen()
-                print(f"\n{Colors.BOLD}{Colors.GREEN}🎄 Happy Solo Christmas 🎄{Colors.RESET}\n")
-                time.sleep(2.0)
-                # stop music if playing
-                try:
-                    if music_proc is not None and hasattr(music_proc, 'terminate'):
-                        music_proc.terminate()
-                        music_proc.wait(timeout=1)
-                except Exception:
-                    pass
+def cells_to_segments(cells) -> list:
+    """셀 튜플을 같은 색 구간마다 하나씩의 Rich Segment 목록으로 변환"""
+    load_rich()
+    segments = []
+    run = []
+    current = None
+    for glyph, style in cells:
+        if style != current:
+            if run:
+                segments.append(Segment(''.join(run), rich_style(current)))
+                run = []
+            current = style
+        run.append(glyph)
+    if run:
+        segments.append(Segment(''.join(run), rich_style(current)))
+    return segments
 
-            twinkle_enabled = (not build) or auto_twinkle
-            while time.time() - start_time < duration:
-                clear_screen()
 
-                # 제목 출력
-                title = f"{Colors.BOLD}{Colors.GREEN}🎄 Merry Christmas! 🎄{Colors.RESET}"
-                print(title)
-                print()
+def _render_row_segments(tree, r: int, animation_frame: int) -> tuple:
+    """트리의 한 행을 (Segment 목록, 셀 폭)으로 렌더"""
+    segments = cells_to_segments(_render_row_cells(tree, r, animation_frame))
+    return segments, sum(seg.cell_length for seg in segments)
 
-                # 트리 출력 (조명만 깜빡임)
-                frame_for_render = frame if twinkle_enabled else 0
-                print(print_tree_with_lights(tree_data, frame_for_render))
 
-                # 깜빡이는 텍스트 (애니메이션 효과)
-                if frame % 4 < 2:
-                    footer = f"{Colors.RED}{Colors.BOLD}✨ Jingle Bells! ✨{Colors.RESET}"
+_SNOW_SEGMENTS = {}
+
+
+def _snow_segments(segments, width: int, snow) -> tuple:
+    """행 Segment 목록에 눈((열 목록, 셀 목록))을 겹친 (Segment 목록, 셀 폭)
+
+    눈이 없는 Segment는 그대로 쓰고 눈이 떨어진 Segment만 문자열을 잘라 나눈다.
+    모든 글자가 한 칸인 행에만 쓴다 (별 행은 _snow_row로 셀에서 다시 만든다).
+    """
+    cols, cells = snow
+    n = len(cols)
+    out = []
+    k = 0
+    col = 0
+    for seg in segments:
+        text = seg.text
+        end = col + len(text)
+        if k >= n or cols[k] >= end:
+            out.append(seg)
+            col = end
+            continue
+        style = seg.style
+        pos = 0
+        while k < n and cols[k] < end:
+            i = cols[k] - col
+            if text[i] != '●':
+                if i > pos:
+                    out.append(Segment(text[pos:i], style))
+                out.append(_snow_segment(cells[k]))
+                pos = i + 1
+            k += 1
+        if pos < len(text):
+            out.append(Segment(text[pos:], style))
+        col = end
+    # 행 끝 뒤(오른쪽 배경)에 떨어진 눈
+    for c, cell in zip(cols[k:], cells[k:]):
+        if c > col:
+            out.append(Segment(' ' * (c - col), rich_style(PAL_NONE)))
+        out.append(_snow_segment(cell))
+        col = c + 1
+    return out, max(width, col)
+
+
+def _snow_segment(cell):
+    seg = _SNOW_SEGMENTS.get(cell)
+    if seg is None:
+        seg = _SNOW_SEGMENTS[cell] = Segment(cell[0], rich_style(cell[1]))
+    return seg
+
+
+def render_row_segments(tree, animation_frame: int) -> list:
+    """행별 (Segment 목록, 셀 폭) 목록 (render_lines와 같은 캐시 규칙)"""
+    return _cached_rows(tree, 'segments', animation_frame, _render_row_segments)
+
+
+class TreeRenderable:
+    """ANSI 문자열을 거치지 않고 트리 모델에서 바로 Segment를 만드는 Rich 렌더러블
+
+    render_full_rich와 같은 화면(제목, 트리, 푸터)을 그린다. 행 Segment는
+    트리 행 캐시에 저장되므로 Live가 같은 프레임을 다시 그릴 때 비용이 거의 없다.
+    snow(Snowfall.overlay)를 주면 눈이 있는 행만 셀에서 Segment를 새로 만든다.
+    """
+
+    def __init__(self, tree, animation_frame: int, footer_frame: int | None = None, snow=None):
+        self.tree = tree
+        self.animation_frame = animation_frame
+        self.footer_frame = animation_frame if footer_frame is None else footer_frame
+        self.snow = snow
+
+    def __rich_console__(self, console, options):
+        load_rich()
+        new_line = Segment.line()
+        max_width = options.max_width
+        title = cells_to_segments(_text_cells('🎄 Merry Christmas! 🎄', PAL_TITLE))
+        yield from title
+        yield new_line
+        yield new_line
+        rows = render_row_segments(self.tree, self.animation_frame)
+        if self.snow:
+            tree = self.tree
+            rows = list(rows)
+            for r, marks in self.snow.items():
+                if r >= len(rows):
+                    continue
+                if tree.row_kind[r] == ROW_STAR:
+                    segments = cells_to_segments(_snow_row(tree, r, render_row_cells(tree, self.animation_frame)[r], marks))
+                    rows[r] = (segments, sum(seg.cell_length for seg in segments))
                 else:
-                    footer = f"{Colors.YELLOW}{Colors.BOLD}⭐ Merry Christmas! ⭐{Colors.RESET}"
+                    rows[r] = _snow_segments(*rows[r], marks)
+        for segments, width in rows:
+            if width > max_width:
+                segments = Segment.adjust_line_length(segments, max_width)
+            yield from segments
+            yield new_line
+        yield new_line
+        if self.footer_frame % 4 < 2:
+            footer = _text_cells('✨ Jingle Bells! ✨', PAL_FOOTERS[0])
+        else:
+            footer = _text_cells('⭐ Merry Christmas! ⭐', PAL_FOOTERS[1])
+        yield from cells_to_segments(footer)
+        yield new_line
 
-                print(f"\n{footer}\n")
 
-                frame += 1
-                time.sleep(speed)  # 애니메이션 속도 조절
+def print_tree_with_lights(tree, animation_frame: int, cached: bool = True, encoder: str = 'rle'):
+    """조명 위치가 고정된 크리스마스 트리 출력
 
-    except KeyboardInterrupt:
-        clear_screen()
-        print(f"{Colors.GREEN}{Colors.BOLD}🎄 Happy Holidays! 🎄{Colors.RESET}\n")
-        sys.exit(0)
+    tree: TreeModel (예전 dict 목록도 받아서 변환한다)
+    cached: False면 행 캐시를 쓰지 않고 모든 행을 다시 렌더
+    encoder: 'rle' (같은 색 구간마다 escape) 또는 'plain' (셀마다 escape)
+    """
+    if not isinstance(tree, TreeModel):
+        tree = TreeModel.from_dicts(tree)
+        cached = False
+    if not cached:
+        render_row = ENCODERS[encoder]
+        return '\n'.join(render_row(tree, r, animation_frame) for r in range(tree.n_rows))
+    return '\n'.join(render_lines(tree, animation_frame, encoder))
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Terminal Christmas tree')
-    parser.add_argument('--duration', type=int, default=60, help='애니메이션 지속 시간(초)')
-    parser.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드: single 또는 double')
-    parser.add_argument('--density', type=float, default=0.25, help='조명 밀도 (0-1)')
-    parser.add_argument('--speed', type=float, default=0.5, help='깜빡임 속도 (초)')
-    parser.add_argument('--width', type=int, default=50, help='터미널 폭 기준(중앙 정렬용)')
-    parser.add_argument('--build', action='store_true', help='빌드 애니메이션을 활성화')
-    parser.add_argument('--build-speed', type=float, default=0.02, help='빌드 애니메이션 속도 (초)')
-    parser.add_argument('--auto-twinkle', action='store_true', help='빌드 후 자동으로 조명이 반짝이게 함')
-    parser.add_argument('--gap', type=int, default=1, help='두 삼각형 사이 공백 줄 수 (double 모드)')
-    parser.add_argument('--teardown', action='store_true', help='애니메이션 종료 시 트리를 무작위로 사라지게 함')
-    parser.add_argument('--teardown-speed', type=float, default=0.02, help='트리 사라짐 속도 (초)')
-    parser.add_argument('--teardown-mode', choices=['random', 'reverse'], default='random', help='트리를 사라지게 하는 순서')
-    parser.add_argument('--build-mode', choices=['sequential', 'random'], default='sequential', help='빌드 순서: sequential 또는 random')
-    parser.add_argument('--seed', type=int, default=None, help='빌드 무작위 시드 (선택적)')
-    args = parser.parse_args()
+TITLE = f"{Colors.BOLD}{Colors.GREEN}🎄 Merry Christmas! 🎄{Colors.RESET}"
+FOOTERS = (f"{Colors.RED}{Colors.BOLD}✨ Jingle Bells! ✨{Colors.RESET}",
+           f"{Colors.YELLOW}{Colors.BOLD}⭐ Merry Christmas! ⭐{Colors.RESET}")
+
+
+def footer_for(animation_frame: int) -> str:
+    """프레임 번호에 맞는 깜빡이는 푸터"""
+    return FOOTERS[0] if (animation_frame % 4) < 2 else FOOTERS[1]
+
+
+class FrameCache:
+    """렌더된 프레임(ANSI 문자열 또는 Rich Text)을 보관하는 LRU 캐시
+
+    조명 상태는 효과의 위상 버킷(frame % period, effect_bucket), 푸터는 frame % 4 에만
+    의존하므로 (트리 uid, visible 버전, 위상 버킷)이 같으면 같은 프레임이다.
+    항목 수와 문자열 총 길이를 모두 제한해서 트리가 여러 개이거나 클 때도
+    메모리가 일정하게 유지된다.
+    """
+
+    def __init__(self, max_entries: int = 64, max_chars: int = 4_000_000):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._chars = 0
+
+    def get(self, key, build):
+        """key가 있으면 캐시된 값을, 없으면 build()로 만들어 저장한 값을 반환
+
+        key가 None이면 (매 프레임 달라지는 효과) 캐시하지 않고 build()만 부른다.
+        """
+        if key is None:
+            return build()
+        try:
+            value, size = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = build()
+        size = len(value) if isinstance(value, str) else len(getattr(value, 'plain', ''))
+        if size > self.max_chars:
+            return value
+        self._entries[key] = (value, size)
+        self._chars += size
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self._chars -= old_size
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._chars = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 모든 트리가 공유하는 프레임 캐시
+FRAME_CACHE = FrameCache()
+
+_TEXT_CELLS = {}
+_GLYPH_WIDTHS = {}
+
+
+def _text_cells(text: str, style: int) -> tuple:
+    """한 가지 스타일의 문자열을 셀 튜플로 변환 (결과는 재사용)"""
+    key = (text, style)
+    cells = _TEXT_CELLS.get(key)
+    if cells is None:
+        cells = _TEXT_CELLS[key] = tuple((ch, style) for ch in text)
+    return cells
+
+
+def glyph_width(glyph: str) -> int:
+    """터미널에서 글자가 차지하는 칸 수 (이모지 등 전각 문자는 2)"""
+    w = _GLYPH_WIDTHS.get(glyph)
+    if w is None:
+        w = _GLYPH_WIDTHS[glyph] = 2 if unicodedata.east_asian_width(glyph) in ('W', 'F') else 1
+    return w
+
+
+def frame_grid(tree, animation_frame: int, footer_frame: int | None = None, snow=None) -> list:
+    """render_fallback_frame과 같은 배치의 화면을 셀 그리드(행별 셀 튜플)로 반환
+
+    snow: Snowfall.overlay (트리 행에 겹쳐 그림)
+    """
+    grid = [_text_cells('🎄 Merry Christmas! 🎄', PAL_TITLE), ()]
+    grid += composite_snow(tree, render_row_cells(tree, animation_frame), snow)
+    if footer_frame is not None:
+        if footer_frame % 4 < 2:
+            footer = _text_cells('✨ Jingle Bells! ✨', PAL_FOOTERS[0])
+        else:
+            footer = _text_cells('⭐ Merry Christmas! ⭐', PAL_FOOTERS[1])
+        grid += [(), footer]
+    return grid
+
+
+def snow_grid_rows(snow) -> tuple:
+    """frame_grid에서 눈 overlay가 겹친 행 번호 (제목 두 줄 아래부터 트리 행)"""
+    return tuple(2 + r for r in snow) if snow else ()
+
+
+def encode_cells(cells) -> str:
+    """셀 목록을 ANSI 문자열로 변환 (같은 색이 이어지면 escape를 한 번만 출력)"""
+    parts = []
+    current = PAL_NONE
+    for glyph, style in cells:
+        if style != current:
+            if current != PAL_NONE:
+                parts.append(Colors.RESET)
+            if style != PAL_NONE:
+                parts.append(PALETTE[style])
+            current = style
+        parts.append(glyph)
+    if current != PAL_NONE:
+        parts.append(Colors.RESET)
+    return ''.join(parts)
+
+
+class DiffRenderer:
+    """직전에 출력한 셀 그리드를 기억하고 바뀐 셀만 커서 이동 escape로 다시 쓰는 출력기
+
+    한 프레임은 utf-8로 미리 인코딩해서 한 번의 write로 내보낸다.
+    frames / bytes_total / last_bytes로 프레임당 출력 바이트를 확인할 수 있다.
+    """
+
+    # 바뀐 셀 사이의 그대로인 셀이 이 개수 이하이면 커서를 옮기지 않고 이어서 쓴다
+    MERGE_GAP = 4
+    # (이전 행, 새 행) 조합별로 기억해 두는 행 diff 개수 상한
+    MAX_ROW_DIFFS = 4096
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.prev = None
+        self.frames = 0
+        self.bytes_total = 0
+        self.last_bytes = 0
+        self.closed = False
+        # 행 튜플은 행 캐시에서 재사용되므로, 반짝임처럼 같은 행 조합이 반복되면
+        # 이전에 계산한 diff 문자열을 그대로 쓴다: (id(old), id(new), y) -> (old, new, diff)
+        self._row_diffs = {}
+        # 직전 프레임에서 그 프레임에만 쓴 새 튜플이었던 행 번호 (encode의 volatile)
+        self._volatile = frozenset()
+
+    def invalidate(self):
+        """화면이 외부에서 지워졌을 때 호출 (다음 프레임은 전체를 다시 그림)"""
+        self.prev = None
+
+    def _diff_row(self, y: int, old, new, out):
+        n = min(len(old), len(new))
+        # 바뀐 셀 번호와 한 칸이 아닌 글자의 위치를 먼저 한 번에 모은다 (눈처럼 바뀐 셀이 많은 행도 빠르게)
+        changed = [i for i in range(n) if old[i] != new[i]]
+        width = _GLYPH_WIDTHS.get
+        wide = [i for i, (g, _) in enumerate(new) if width(g, 0) != 1]
+        k = 0
+        extra = 0
+
+        def column(i):
+            # 셀 번호 i가 시작하는 화면 열 (앞쪽 셀은 이전 행과 같거나 폭이 같음)
+            nonlocal k, extra
+            while k < len(wide) and wide[k] < i:
+                extra += glyph_width(new[wide[k]][0]) - 1
+                k += 1
+            return i + extra
+
+        def emit(first, last):
+            out.append(f'\033[{y + 1};{column(first) + 1}H')
+            out.append(encode_cells(new[first:last + 1]))
+
+        first = last = None
+        for i in changed:
+            if glyph_width(old[i][0]) != glyph_width(new[i][0]):
+                # 글자 폭이 달라져 뒤쪽 칸이 밀리는 경우: 그 지점부터 줄 끝까지 다시 씀
+                if first is not None:
+                    emit(first, last)
+                out.append(f'\033[{y + 1};{column(i) + 1}H' + encode_cells(new[i:]) + '\033[K')
+                return
+            if first is not None and i - last <= self.MERGE_GAP:
+                # 바뀐 셀 사이의 그대로인 셀이 MERGE_GAP 이하이면 커서를 옮기지 않고 이어서 씀
+                last = i
+                continue
+            if first is not None:
+                emit(first, last)
+            first = last = i
+        if first is not None:
+            emit(first, last)
+        # 공통 구간이 끝남: 길어진 부분은 쓰고 짧아진 부분은 지운다
+        if len(new) > n:
+            out.append(f'\033[{y + 1};{column(n) + 1}H' + encode_cells(new[n:]))
+        elif len(old) > n:
+            out.append(f'\033[{y + 1};{column(n) + 1}H\033[K')
+
+    def render(self, grid) -> int:
+        """그리드 한 프레임을 출력하고 쓴 바이트 수를 반환"""
+        return self.write(self.encode(grid))
+
+    def write(self, data: bytes) -> int:
+        """encode()한 바이트를 스트림에 씀"""
+        if data:
+            self.stream.write(data)
+            self.stream.flush()
+        return len(data)
+
+    def encode(self, grid, volatile=()) -> bytes:
+        """직전 프레임과의 차이를 utf-8 바이트로 만들어 반환 (출력은 하지 않음)
+
+        volatile: 이 프레임에만 쓰는 새 튜플인 행 번호 (눈이 겹친 행, snow_grid_rows).
+                  다시 나올 일이 없으므로 이 행과 직전 프레임의 volatile 행은 diff를 기억하지 않는다.
+        """
+        out = []
+        prev = self.prev
+        if prev is None:
+            # 첫 프레임: 커서를 숨기고 화면 전체를 지운다
+            out.append('\033[?25l\033[2J')
+            prev = []
+        row_diffs = self._row_diffs
+        volatile = frozenset(volatile)
+        skip = volatile | self._volatile if self._volatile else volatile
+        for y, row in enumerate(grid):
+            old = prev[y] if y < len(prev) else ()
+            if row is old or row == old:
+                continue
+            if y in skip:
+                part = []
+                self._diff_row(y, old, row, part)
+                out.append(''.join(part))
+                continue
+            key = (id(old), id(row), y)
+            hit = row_diffs.get(key)
+            # 캐시 항목이 두 튜플을 붙잡고 있으므로 id가 다른 객체에 재사용될 수 없다
+            if hit is not None and hit[0] is old and hit[1] is row:
+                out.append(hit[2])
+                continue
+            part = []
+            self._diff_row(y, old, row, part)
+            diff = ''.join(part)
+            if len(row_diffs) >= self.MAX_ROW_DIFFS:
+                row_diffs.clear()
+            row_diffs[key] = (old, row, diff)
+            out.append(diff)
+        for y in range(len(grid), len(prev)):
+            if prev[y]:
+                out.append(f'\033[{y + 1};1H\033[K')
+        data = ''.join(out).encode('utf-8')
+        self.prev = list(grid)
+        self._volatile = volatile
+        self.frames += 1
+        self.last_bytes = len(data)
+        self.bytes_total += len(data)
+        return data
+
+    def close(self):
+        """커서를 그리드 아래로 옮기고 다시 보이게 함"""
+        if self.closed:
+            return
+        self.closed = True
+        rows = len(self.prev) if self.prev else 0
+        self.stream.write(f'\033[{rows + 1};1H\033[?25h'.encode('ascii'))
+        self.stream.flush()
+
+    def stats(self) -> str:
+        avg = self.bytes_total / self.frames if self.frames else 0
+        return f"diff output: {self.frames} frames, {avg:.0f} bytes/frame on average ({self.bytes_total} bytes total)"
+
+
+def render_tree_rich(tree_data, animation_frame: int):
+    """Rich용 렌더러: ANSI 문자열을 Text로 변환해 반환"""
+    ansi_str = print_tree_with_lights(tree_data, animation_frame)
+    if load_rich():
+        return Text.from_ansi(ansi_str)
+    # fallback
+    return ansi_str
+
+def render_full_ansi(tree_data, animation_frame: int, encoder: str = 'rle') -> str:
+    """제목, 트리, 푸터를 합친 ANSI 문자열 (프레임 캐시 사용)
+
+    푸터는 animation_frame % 4로 바뀌므로 효과 bucket과 함께 캐시 키에 넣는다.
+    """
+    if not isinstance(tree_data, TreeModel):
+        tree_data = TreeModel.from_dicts(tree_data)
+    bucket = effect_bucket(tree_data, animation_frame)
+    footer_key = animation_frame % 4
+    key = None if bucket is None else ('full', encoder, tree_data.uid, tree_data.version, bucket, footer_key)
+    return FRAME_CACHE.get(key, lambda: (TITLE + "\n\n" + print_tree_with_lights(tree_data, animation_frame, encoder=encoder)
+                                         + "\n\n" + footer_for(animation_frame)))
+
+
+def render_full_rich(tree_data, animation_frame: int, encoder: str = 'rle'):
+    """제목, 트리, 푸터를 합쳐서 하나의 Text로 반환 (트리가 바뀌기 전까지 캐시 재사용)"""
+    if not isinstance(tree_data, TreeModel):
+        tree_data = TreeModel.from_dicts(tree_data)
+    if not load_rich():
+        return render_full_ansi(tree_data, animation_frame, encoder)
+    bucket = effect_bucket(tree_data, animation_frame)
+    footer_key = animation_frame % 4
+    key = None if bucket is None else ('full_text', encoder, tree_data.uid, tree_data.version, bucket, footer_key)
+    return FRAME_CACHE.get(key, lambda: Text.from_ansi(render_full_ansi(tree_data, animation_frame, encoder)))
+
+
+def render_fallback_frame(tree_data, animation_frame: int, footer_frame: int | None = None, encoder: str = 'rle',
+                          snow=None) -> str:
+    """Rich 없이 출력할 한 화면 (화면 지우기 포함, 캐시 사용)
+
+    footer_frame이 None이면 푸터 없이 제목과 트리만 그린다 (빌드/해체 단계).
+    snow(Snowfall.overlay)가 있으면 눈이 있는 행만 셀에서 다시 인코딩하고 프레임 캐시는 쓰지 않는다.
+    """
+    footer_key = None if footer_frame is None else footer_frame % 4
+    bucket = effect_bucket(tree_data, animation_frame)
+    key = None if bucket is None or snow else ('fallback', encoder, tree_data.uid, tree_data.version, bucket, footer_key)
+
+    def build():
+        if snow:
+            lines = list(render_lines(tree_data, animation_frame, encoder))
+            cells = render_row_cells(tree_data, animation_frame)
+            for r, marks in snow.items():
+                if r < len(lines):
+                    lines[r] = encode_cells(_snow_row(tree_data, r, cells[r], marks))
+            body = '\n'.join(lines)
+        else:
+            body = print_tree_with_lights(tree_data, animation_frame, encoder=encoder)
+        out = '\033[2J\033[H' + TITLE + '\n\n' + body + '\n'
+        if footer_frame is not None:
+            out += f"\n{footer_for(footer_frame)}\n\n"
+        return out
+
+    return FRAME_CACHE.get(key, build)
+
+# 빌드/해체 순서
+TRANSITION_ORDERS = ('sequential', 'reverse', 'random', 'topdown', 'radial', 'spiral')
+
+
+def element_coords(tree):
+    """요소마다 화면 좌표 (ys, xs) 배열 (셀은 자기 칸, 줄기 행은 가운데, 별은 별 자리)"""
+    specials = list(tree.special_rows)
+    np = tree.np
+    if np is not None:
+        cell_row = tree.cell_row.astype(np.int64)
+        padding = tree.row_padding.astype(np.int64)
+        start = tree.row_start.astype(np.int64)
+        sp = np.asarray(specials, dtype=np.int64)
+        xs = np.concatenate([padding[cell_row] + np.arange(tree.n_cells) - start[cell_row],
+                             padding[sp] + tree.row_width.astype(np.int64)[sp] // 2])
+        ys = np.concatenate([cell_row, sp])
+        return ys, xs
+    ys = array('i')
+    xs = array('i')
+    for r in range(tree.n_rows):
+        if tree.row_kind[r] == ROW_TREE:
+            w = tree.row_width[r]
+            ys.extend(array('i', [r]) * w)
+            xs.extend(range(tree.row_padding[r], tree.row_padding[r] + w))
+    for r in specials:
+        ys.append(r)
+        xs.append(tree.row_padding[r] + tree.row_width[r] // 2)
+    return ys, xs
+
+
+def _bucket_order(keys, n_buckets: int, np=None):
+    """정수 키(0..n_buckets-1)로 안정 정렬한 인덱스 배열 (O(N + K) 버킷 정렬, np가 있으면 ndarray)"""
+    if np is not None:
+        keys = np.asarray(keys)
+        if n_buckets <= 1 << 16:
+            # uint16 키는 NumPy가 기수 정렬(O(N))로 안정 정렬한다
+            keys = keys.astype(np.uint16)
+        return np.argsort(keys, kind='stable').astype(np.int32)
+    buckets = [[] for _ in range(n_buckets)]
+    for i, k in enumerate(keys):
+        buckets[k].append(i)
+    order = array('i')
+    for bucket in buckets:
+        order.extend(bucket)
+    return order
+
+
+def _as_index_array(values, np=None):
+    if np is not None:
+        return np.asarray(values, dtype=np.int32)
+    return array('i', values)
+
+
+def transition_schedule(tree, order: str = 'sequential', seed: int | None = None, phase: str = 'build'):
+    """빌드/해체 때 요소를 바꿀 순서를 정수 인덱스 배열로 계산 (O(N))
+
+    order: TRANSITION_ORDERS 중 하나
+      sequential  셀(위->아래, 왼->오른쪽), 줄기, 별 순서
+      reverse     sequential의 역순
+      random      무작위 (빌드는 셀만 섞고 줄기/별은 마지막, 해체는 전부 섞음)
+      topdown     화면 위 행부터 (줄기/별도 자기 행 위치에서)
+      radial      별에서 가까운 요소부터
+      spiral      별을 중심으로 한 나선을 따라
+    seed: 같은 시드면 같은 random 순서 (NumPy 유무와 무관)
+    phase: 'build' 또는 'teardown'
+    """
+    n = tree.n_elements
+    np = tree.np
+    if order == 'sequential':
+        return _as_index_array(range(n), np)
+    if order == 'reverse':
+        return _as_index_array(range(n - 1, -1, -1), np)
+    if order == 'random':
+        count = tree.n_cells if phase == 'build' else n
+        if seed is None and np is not None:
+            shuffled = np.random.permutation(count).astype(np.int32)
+        else:
+            shuffled = list(range(count))
+            (random if seed is None else random.Random(seed)).shuffle(shuffled)
+        if count < n:
+            shuffled = list(shuffled) + list(range(count, n))
+        return _as_index_array(shuffled, np)
+
+    ys, xs = element_coords(tree)
+    if order == 'topdown':
+        return _bucket_order(ys, tree.n_rows, np)
+    # 별 기준 거리 (터미널 글자는 세로가 가로의 약 2배이므로 가로 거리는 절반으로 본다)
+    star = tree.special_rows[-1] if len(tree.special_rows) else 0
+    cy = star
+    cx = tree.row_padding[star] if len(tree.special_rows) else 0
+    if np is not None:
+        dy = ys.astype(np.float64) - cy
+        dx = (xs.astype(np.float64) - cx) * 0.5
+        dist = np.sqrt(dx * dx + dy * dy)
+    else:
+        dy = [y - cy for y in ys]
+        dx = [(x - cx) * 0.5 for x in xs]
+        dist = [math.sqrt(a * a + b * b) for a, b in zip(dx, dy)]
+    if order == 'radial':
+        if np is not None:
+            keys = dist.astype(np.int64)
+            return _bucket_order(keys, int(keys.max()) + 1 if n else 1, np)
+        keys = [int(d) for d in dist]
+        return _bucket_order(keys, max(keys, default=0) + 1)
+    if order == 'spiral':
+        # 아르키메데스 나선 r = pitch * (k + theta / 2pi) 위의 위치 k + theta / 2pi 순서
+        pitch = 3.0
+        steps = 16   # 한 바퀴를 나누는 칸 수
+        if np is not None:
+            turn = (np.arctan2(dy, dx) + math.pi) / (2 * math.pi)
+            pos = np.floor(dist / pitch - turn) + turn
+            keys = (pos * steps).astype(np.int64) + steps
+            return _bucket_order(keys, int(keys.max()) + 1 if n else 1, np)
+        keys = []
+        for a, b, d in zip(dx, dy, dist):
+            turn = (math.atan2(b, a) + math.pi) / (2 * math.pi)
+            keys.append(int((math.floor(d / pitch - turn) + turn) * steps) + steps)
+        return _bucket_order(keys, max(keys, default=0) + 1)
+    raise ValueError(f"unknown transition order: {order}")
+
+
+# 빌드/해체 중 화면을 다시 그리는 최소 간격 (Rich Live 갱신 주기 24fps보다 약간 짧게)
+MIN_FRAME_INTERVAL = 1 / 30
+
+
+class FrameScheduler:
+    """단조 시계(time.monotonic) 기준 절대 마감 시각으로 프레임 간격을 맞추는 스케줄러
+
+    렌더 시간이 프레임 간격에 더해지지 않도록 매 프레임의 마감 시각을 시작 시각에서
+    계산한다. 마감을 놓치면 late를 세고, 그동안 지나간 프레임은 건너뛰어(dropped)
+    wait()가 한 번에 여러 프레임만큼 진행하도록 알려준다. 간격은 MIN_FRAME_INTERVAL보다
+    짧아지지 않는다.
+    """
+
+    def __init__(self, interval: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = max(interval, MIN_FRAME_INTERVAL)
+        self.clock = clock
+        self.sleep = sleep
+        self.start = clock()
+        self.deadline = self.start + self.interval
+        self.frames = 0
+        self.late = 0
+        self.dropped = 0
+
+    def elapsed(self) -> float:
+        return self.clock() - self.start
+
+    def advance(self) -> tuple:
+        """다음 프레임으로 넘어감: (기다릴 시간, 진행할 프레임 수(1 이상))를 반환"""
+        now = self.clock()
+        self.frames += 1
+        if now < self.deadline:
+            delay = self.deadline - now
+            self.deadline += self.interval
+            return delay, 1
+        # 늦음: 이미 지나간 마감은 건너뛰고 다음 마감부터 다시 맞춘다
+        self.late += 1
+        behind = int((now - self.deadline) // self.interval)
+        self.dropped += behind
+        self.deadline += (behind + 1) * self.interval
+        return 0.0, behind + 1
+
+    def wait(self) -> int:
+        """다음 마감 시각까지 기다린 뒤 진행할 프레임 수(1 이상)를 반환"""
+        delay, frames = self.advance()
+        if delay > 0:
+            self.sleep(delay)
+        return frames
+
+    async def wait_async(self, sleep=None) -> int:
+        """wait()의 asyncio 버전 (기다리는 동안 다른 태스크가 돈다, sleep 기본값은 asyncio.sleep)"""
+        if sleep is None:
+            import asyncio
+            sleep = asyncio.sleep
+        delay, frames = self.advance()
+        if delay > 0:
+            await sleep(delay)
+        return frames
+
+    def rebase(self, interval: float | None = None):
+        """일시정지나 속도 변경 뒤 지금부터 다시 마감 시각을 맞춤"""
+        if interval is not None:
+            self.interval = max(interval, MIN_FRAME_INTERVAL)
+        self.deadline = self.clock() + self.interval
+
+    def summary(self) -> dict:
+        return {'frames': self.frames, 'late': self.late, 'dropped': self.dropped}
+
+
+def transition_target(tick: int, n: int, step_time: float) -> int:
+    """빌드/해체 tick번째 프레임(1부터)까지 바뀌어 있어야 할 요소 수"""
+    if step_time <= 0:
+        return n
+    interval = max(step_time, MIN_FRAME_INTERVAL)
+    return min(n, math.ceil(tick * interval / step_time - 1e-9))
+
+
+def run_transition(tree, positions, flag: bool, step_time: float, show, clock=time.monotonic, sleep=time.sleep):
+    """positions(transition_schedule 인덱스 배열) 순서대로 요소의 visible을 flag로 바꾸는
+    빌드/해체 단계 (스케줄러 반환)
+
+    요소 하나당 step_time초, 전체 len(positions) * step_time초에 끝나도록
+    프레임(최소 MIN_FRAME_INTERVAL 간격)마다 필요한 만큼의 요소를 한꺼번에 바꾼다.
+    렌더가 늦어져 프레임을 건너뛰면 다음 프레임에서 그만큼 더 많이 바꾼다.
+    """
+    sched = FrameScheduler(max(step_time, MIN_FRAME_INTERVAL), clock=clock, sleep=sleep)
+    n = len(positions)
+    steps = _transition_steps(tree, positions, flag, step_time)
+    done = next(steps)
+    while True:
+        show()
+        if done >= n:
+            break
+        done = steps.send(sched.wait())
+    return sched
+
+
+def _transition_steps(tree, positions, flag: bool, step_time: float, start: int = 0):
+    """빌드/해체 프레임마다 필요한 만큼 visible을 바꾸고 지금까지 바꾼 요소 수를 yield하는 제너레이터
+
+    send()로 이번에 진행한 프레임 수(스케줄러의 wait() 값)를 받는다. start는 이미 바꾼
+    요소 수로, 도중에 속도가 바뀌면 남은 요소를 새 step_time으로 다시 나눌 때 쓴다.
+    """
+    n = len(positions)
+    done = start
+    tick = 1
+    while True:
+        target = start + transition_target(tick, n - start, step_time)
+        if target > done:
+            tree.set_visible_many(positions[done:target], flag)
+        done = target
+        tick += yield done
+
+
+class FrameEvent(NamedTuple):
+    """iter_animation이 내보내는 한 프레임
+
+    t: 애니메이션 시작 기준 시각(초), phase: 'build' / 'twinkle' / 'teardown' / 'message' / 'end'
+    ('end'는 마지막 메시지를 보여준 뒤 끝나는 시각을 알리는 빈 이벤트)
+    frame, footer: 렌더에 쓸 프레임 번호와 푸터 프레임 (footer None이면 푸터 없음)
+    message: phase가 'message'일 때 화면에 띄울 문자열
+    """
+    t: float
+    phase: str
+    frame: int
+    footer: int | None
+    message: str = ''
+
+
+def iter_animation(tree, duration: float = 60, speed: float = 0.5, build: bool = False, build_speed: float = 0.02,
+                   auto_twinkle: bool = False, build_mode: str = 'sequential', seed: int | None = None,
+                   teardown: bool = False, teardown_speed: float = 0.02, teardown_mode: str = 'random',
+                   transition_footer: int | None = None):
+    """animate_tree와 같은 순서(빌드 -> 반짝임 -> 해체 -> 마지막 메시지)의 프레임을 가상 시간으로 생성
+
+    실제로 기다리지 않고 각 프레임의 시각만 계산한다. 프레임을 내보내기 직전에 tree의
+    visible을 바꿔 두므로, 소비하는 쪽은 받은 즉시 tree를 렌더하면 된다.
+    """
+    tree.set_all_visible(not build)
+    t = 0.0
+    if build:
+        schedule = transition_schedule(tree, build_mode, seed, phase='build')
+        yield from _iter_transition(tree, schedule, True, build_speed, 'build', transition_footer, t)
+        t = len(schedule) * max(build_speed, 0)
+
+    twinkle_enabled = (not build) or auto_twinkle
+    # animate_tree의 FrameScheduler와 같이 프레임 간격은 MIN_FRAME_INTERVAL 이상
+    step = max(speed, MIN_FRAME_INTERVAL)
+    frame = 0
+    while True:
+        frame_t = t + frame * step
+        if frame_t >= duration:
+            break
+        yield FrameEvent(frame_t, 'twinkle', frame if twinkle_enabled else 0, frame)
+        frame += 1
+    t = max(duration, t)
+
+    if teardown:
+        schedule = transition_schedule(tree, teardown_mode, seed, phase='teardown')
+        yield from _iter_transition(tree, schedule, False, teardown_speed, 'teardown', transition_footer, t)
+        t += len(schedule) * max(teardown_speed, 0)
+        yield FrameEvent(t, 'message', 0, None,
+                         f"\n{Colors.BOLD}{Colors.GREEN}🎄 Happy Solo Christmas 🎄{Colors.RESET}\n")
+        # 메시지를 2초 보여준 뒤 끝남을 알리는 빈 이벤트
+        yield FrameEvent(t + 2.0, 'end', 0, None)
+
+
+def _iter_transition(tree, schedule, flag: bool, step_time: float, phase: str, footer, t0: float):
+    n = len(schedule)
+    interval = max(step_time, MIN_FRAME_INTERVAL)
+    done = 0
+    tick = 1
+    while True:
+        target = transition_target(tick, n, step_time)
+        if target > done:
+            tree.set_visible_many(schedule[done:target], flag)
+        done = target
+        yield FrameEvent(t0 + (tick - 1) * interval, phase, 0, footer)
+        if done >= n:
+            break
+        tick += 1
+
+
+def grid_size(tree) -> tuple:
+    """frame_grid 화면의 (폭, 높이) (푸터 포함)"""
+    width = 24
+    for r in range(tree.n_rows):
+        w = int(tree.row_padding[r]) + int(tree.row_width[r]) + (1 if tree.row_kind[r] == ROW_STAR else 0)
+        width = max(width, w)
+    return width, tree.n_rows + 4
+
+
+def _encode_event(encoder, tree, event) -> bytes:
+    """iter_animation 이벤트 하나를 터미널에 쓸 바이트로 인코딩 (바뀐 셀만)"""
+    if event.phase == 'message':
+        encoder.invalidate()
+        return ('\033[2J\033[H' + event.message).encode('utf-8')
+    if event.phase == 'end':
+        return b''
+    return encoder.encode(frame_grid(tree, event.frame, event.footer))
+
+
+def encode_animation(tree, **timeline):
+    """(이벤트, 인코딩한 바이트)를 순서대로 생성 (한 프로세스에서)"""
+    encoder = DiffRenderer(stream=None)
+    for event in iter_animation(tree, **timeline):
+        yield event, _encode_event(encoder, tree, event)
+
+
+# 프리렌더 워커 프로세스의 상태 (_prerender_init이 채움)
+_PRERENDER = {}
+
+
+def _prerender_init(name: str, layout: dict, timeline: dict, effect):
+    # Ctrl-C는 메인 프로세스가 받아서 풀을 정리한다
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    tree = attach_model(shm.buf, layout)
+    tree.effect = effect
+    _PRERENDER.update(shm=shm, tree=tree, timeline=timeline, events=None, position=0)
+
+
+def _prerender_chunk(start: int, end: int) -> list:
+    """이벤트 [start, end)를 인코딩해 바이트 목록으로 반환 (워커에서 실행)
+
+    워커는 같은 timeline으로 iter_animation을 직접 돌려 트리 상태를 재현한다. 이전에
+    맡은 청크 뒤라면 이어서 진행하고, 앞이면 처음부터 다시 돈다. diff 인코딩이 이어지도록
+    start - 1번째 이벤트는 인코딩만 하고 버린다.
+    """
+    state = _PRERENDER
+    tree = state['tree']
+    if state['events'] is None or state['position'] > max(start - 1, 0):
+        state['events'] = iter_animation(tree, **state['timeline'])
+        state['encoder'] = DiffRenderer(stream=None)
+        state['position'] = 0
+    events = state['events']
+    encoder = state['encoder']
+    out = []
+    for event in events:
+        i = state['position']
+        state['position'] += 1
+        if i == start - 1:
+            _encode_event(encoder, tree, event)
+        elif i >= start:
+            out.append(_encode_event(encoder, tree, event))
+            if i + 1 >= end:
+                break
+    return out
+
+
+def prerender_animation(tree, workers: int | None = None, chunk: int = 32, **timeline):
+    """encode_animation과 같은 (이벤트, 바이트)를 프로세스 풀에서 미리 렌더해 순서대로 생성
+
+    이벤트 chunk개씩을 워커에 나눠 주고, 결과는 제출한 순서대로 꺼낸다. 트리 배열은
+    share_model로 한 번만 공유 메모리에 올리므로 워커에 복사되지 않는다. 진행 중인
+    청크는 워커 수의 두 배까지만 두어 메모리를 제한한다. workers가 None이면 CPU 수.
+
+    무작위 빌드/해체 순서가 워커마다 같도록 seed가 없으면 하나 정해서 쓴다.
+    """
+    import multiprocessing
+    if timeline.get('seed') is None:
+        timeline['seed'] = random.getrandbits(32)
+    workers = workers or os.cpu_count() or 1
+    shm, layout = share_model(tree)
+    try:
+        with multiprocessing.Pool(workers, initializer=_prerender_init,
+                                  initargs=(shm.name, layout, timeline, tree.effect)) as pool:
+            pending = deque()
+            events = iter_animation(tree, **timeline)
+            submitted = 0
+            exhausted = False
+            while True:
+                # 이 프로세스는 이벤트 목록(시각)만 만들고 렌더는 워커가 한다
+                while not exhausted and len(pending) < 2 * workers:
+                    batch = list(itertools.islice(events, chunk))
+                    if not batch:
+                        exhausted = True
+                        break
+                    pending.append((batch, pool.apply_async(_prerender_chunk, (submitted, submitted + len(batch)))))
+                    submitted += len(batch)
+                if not pending:
+                    break
+                batch, result = pending.popleft()
+                yield from zip(batch, result.get())
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def export_animation(path: str, tree, fmt: str = 'cast', title: str = 'Merry Christmas', workers: int = 0,
+                     **timeline):
+    """애니메이션을 실시간 대기 없이 파일로 기록 (asciicast v2 또는 raw ANSI)
+
+    프레임은 iter_animation에서 하나씩 받아 DiffRenderer로 바뀐 셀만 인코딩한 뒤 바로
+    파일에 쓰므로, 길거나 넓은 녹화도 메모리에 한꺼번에 올라가지 않는다.
+    workers가 0보다 크면 prerender_animation으로 그만큼의 프로세스에서 렌더한다.
+    timeline은 iter_animation의 키워드 인자. (프레임 수, 쓴 바이트 수)를 반환한다.
+    """
+    import json
+    if workers > 0:
+        frames_iter = prerender_animation(tree, workers, **timeline)
+    else:
+        frames_iter = encode_animation(tree, **timeline)
+    width, height = grid_size(tree)
+    frames = 0
+    with contextlib.closing(frames_iter), open(path, 'wb') as f:
+        if fmt == 'cast':
+            header = {'version': 2, 'width': width, 'height': height, 'timestamp': int(time.time()),
+                      'title': title, 'env': {'TERM': os.environ.get('TERM', 'xterm-256color')}}
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+        for event, data in frames_iter:
+            if not data:
+                continue
+            if fmt == 'cast':
+                line = json.dumps([round(event.t, 6), 'o', data.decode('utf-8')], ensure_ascii=False)
+                f.write(line.encode('utf-8') + b'\n')
+            else:
+                f.write(data)
+            frames += 1
+        # 커서를 다시 보이게 하고 화면 아래로
+        tail = f'\033[{height + 1};1H\033[?25h'
+        if fmt == 'cast':
+            end_t = event.t if frames else 0.0
+            f.write(json.dumps([round(end_t, 6), 'o', tail]).encode('utf-8') + b'\n')
+        else:
+            f.write(tail.encode('ascii'))
+        size = f.tell()
+    return frames, size
+
+
+def play_recording(path: str, speed: float = 1.0, out=None):
+    """export_animation으로 만든 asciicast 파일을 기록된 시각에 맞춰 재생
+
+    파일은 mmap으로 열어 한 줄씩 읽으므로 큰 녹화도 전부 메모리에 올리지 않는다.
+    raw ANSI 파일은 시간 정보가 없으므로 그대로 출력한다.
+    """
+    import json
+    import mmap
+    out = out if out is not None else sys.stdout.buffer
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first = mm.readline()
+            try:
+                header = json.loads(first)
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('version') != 2:
+                # raw ANSI: 시간 정보 없음 (복사하지 않고 매핑을 그대로 쓴다)
+                with memoryview(mm) as view:
+                    out.write(view)
+                out.flush()
+                return
+            start = time.monotonic()
+            while True:
+                line = mm.readline()
+                if not line:
+                    break
+                t, kind, data = json.loads(line)
+                if kind != 'o':
+                    continue
+                delay = start + t / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                out.write(data.encode('utf-8'))
+                out.flush()
+
+
+def play_prerendered(tree, workers: int | None = None, out=None, **timeline):
+    """prerender_animation으로 미리 렌더한 프레임을 실시간으로 출력
+
+    프레임은 앞선 변경에 이어지는 diff이므로 늦어도 건너뛰지 않고 바로 이어서 쓴다.
+    timeline이 미리 정해지므로 키보드 조작은 쓰지 않는다.
+    """
+    out = out if out is not None else sys.stdout.buffer
+    height = grid_size(tree)[1]
+    start = time.monotonic()
+    frames = prerender_animation(tree, workers, **timeline)
+    try:
+        for event, data in frames:
+            delay = start + event.t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if data:
+                out.write(data)
+                out.flush()
+    finally:
+        # Ctrl-C로 끝나도 워커 풀과 공유 메모리를 바로 정리
+        frames.close()
+        # 커서를 다시 보이게 하고 화면 아래로
+        out.write(f'\033[{height + 1};1H\033[?25h'.encode('ascii'))
+        out.flush()
+
+
+class BroadcastClient:
+    """브로드캐스트 서버에 붙은 터미널 클라이언트 하나 (전송 큐와 통계)"""
+
+    def __init__(self, writer, max_queue: int):
+        import asyncio
+        self.writer = writer
+        self.task = None
+        self.peer = writer.get_extra_info('peername')
+        self.queue = asyncio.Queue(maxsize=max(3, max_queue))
+        self.last_keyframe = None
+        self.connected_at = time.monotonic()
+        self.needs_keyframe = True
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def offer(self, data: bytes, keyframe, stamp: float):
+        """프레임을 큐에 넣음. 큐가 차 있으면 밀린 프레임을 버리고 키프레임으로 다시 맞춘다
+
+        diff 프레임은 앞 프레임에 이어져야 하므로, 하나라도 버리면 다음에는
+        화면 전체를 다시 그리는 키프레임(keyframe())을 보낸다.
+        """
+        self.last_keyframe = keyframe
+        if self.queue.full():
+            self._drop_pending()
+        if self.needs_keyframe:
+            data = keyframe()
+            self.needs_keyframe = False
+        self.queue.put_nowait((stamp, data))
+
+    def _drop_pending(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.frames_dropped += 1
+        self.needs_keyframe = True
+
+    def finish(self):
+        """남은 프레임을 보낸 뒤 커서를 되돌리고 연결을 끝내도록 예약"""
+        if self.queue.qsize() > self.queue.maxsize - 3:
+            self._drop_pending()
+        if self.needs_keyframe and self.last_keyframe is not None:
+            self.queue.put_nowait((time.monotonic(), self.last_keyframe()))
+        self.queue.put_nowait((time.monotonic(), b'\033[?25h\r\n'))
+        self.queue.put_nowait((time.monotonic(), None))
+
+    async def run(self):
+        """큐의 프레임을 소켓으로 보냄 (drain으로 클라이언트 속도에 맞춤)"""
+        while True:
+            stamp, data = await self.queue.get()
+            if data is None:
+                break
+            self.writer.write(data)
+            await self.writer.drain()
+            lag = time.monotonic() - stamp
+            self.frames_sent += 1
+            self.bytes_sent += len(data)
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.connected_at, 1e-9)
+        avg_lag = self.lag_total / self.frames_sent if self.frames_sent else 0.0
+        return (f"{self.peer}: {self.frames_sent} frames, {self.frames_dropped} dropped, "
+                f"{self.bytes_sent / elapsed / 1024:.1f} KiB/s, lag avg {avg_lag * 1e3:.1f} ms "
+                f"max {self.lag_max * 1e3:.1f} ms")
+
+
+async def serve_tree(tree, host: str = '127.0.0.1', port: int = 0, max_queue: int = 8, report_interval: float = 5.0,
+                     cycles: int | None = None, ready=None, log=None, **timeline):
+    """트리를 한 번만 렌더해서 접속한 모든 TCP 클라이언트에 같은 바이트를 보내는 서버
+
+    프레임은 iter_animation 시각에 맞춰 진행하고 (늦으면 건너뜀), DiffRenderer로 한 번
+    인코딩한 결과를 클라이언트마다의 큐에 넣는다. 느린 클라이언트는 큐가 차면 밀린
+    프레임을 버리고 키프레임을 받는다. cycles가 None이면 애니메이션을 계속 반복한다.
+    ready(port)는 서버가 열린 뒤 호출된다. log는 클라이언트 통계를 받을 함수 (기본 stderr).
+    """
+    import asyncio
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+    clients = set()
+    tasks = set()
+
+    async def handle(reader, writer):
+        client = BroadcastClient(writer, max_queue)
+        client.task = asyncio.current_task()
+        clients.add(client)
+        log(f"client connected: {client.peer}")
+        try:
+            await client.run()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            clients.discard(client)
+            log(f"client disconnected: {client.report()}")
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    port = server.sockets[0].getsockname()[1]
+    if ready is not None:
+        ready(port)
+
+    async def report_loop():
+        while True:
+            await asyncio.sleep(report_interval)
+            for client in list(clients):
+                log(client.report())
+
+    if report_interval:
+        tasks.add(asyncio.ensure_future(report_loop()))
+
+    encoder = DiffRenderer(stream=None)
+    cycle = 0
+    async with server:
+        try:
+            while cycles is None or cycle < cycles:
+                cycle += 1
+                start = time.monotonic()
+                events = iter_animation(tree, **timeline)
+                for event in events:
+                    delay = start + event.t - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    elif delay < -MIN_FRAME_INTERVAL and event.phase in ('build', 'teardown', 'twinkle'):
+                        # 늦은 프레임은 그리지 않는다 (트리 상태는 이미 반영되어 다음 프레임에 보임)
+                        continue
+                    if event.phase == 'end':
+                        continue
+                    stamp = time.monotonic()
+                    if event.phase == 'message':
+                        data = ('\033[2J\033[H' + event.message).encode('utf-8')
+                        encoder.invalidate()
+                        keyframe = (lambda d=data: d)
+                    else:
+                        grid = frame_grid(tree, event.frame, event.footer)
+                        data = encoder.encode(grid)
+                        keyframe_cache = []
+
+                        def keyframe(grid=grid, cache=keyframe_cache):
+                            # 프레임마다 최대 한 번만 전체 화면을 인코딩
+                            if not cache:
+                                cache.append(DiffRenderer(stream=None).encode(grid))
+                            return cache[0]
+                    for client in list(clients):
+                        client.offer(data, keyframe, stamp)
+                # 다음 반복이 첫 프레임부터 화면 전체를 그리도록
+                encoder.invalidate()
+        finally:
+            for task in tasks:
+                task.cancel()
+            pending = [client.task for client in clients]
+            for client in list(clients):
+                client.finish()
+            if pending:
+                # 밀린 프레임을 잠깐 기다려 주고, 그래도 남은 연결은 끊는다
+                await asyncio.wait(pending, timeout=1.0)
+                for task in pending:
+                    task.cancel()
+    return port
+
+
+class LatencyHistogram:
+    """2의 거듭제곱 마이크로초 버킷으로 지연 시간을 세는 히스토그램"""
+
+    __slots__ = ('counts', 'n', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * 40
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        # 버킷 b에는 2^(b-1)us 이상 2^b us 미만이 들어간다
+        self.counts[min(int(seconds * 1e6).bit_length(), 39)] += 1
+        self.n += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """q 분위가 들어 있는 버킷의 상한 (초)"""
+        rank = q * self.n
+        seen = 0
+        for b, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** b / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.n,
+            'mean_ms': round(self.total / self.n * 1e3, 3) if self.n else 0.0,
+            'p50_ms': round(self.percentile(0.5) * 1e3, 3),
+            'p90_ms': round(self.percentile(0.9) * 1e3, 3),
+            'p99_ms': round(self.percentile(0.99) * 1e3, 3),
+            'max_ms': round(self.max * 1e3, 3),
+            'total_ms': round(self.total * 1e3, 3),
+            'buckets_us': {f"<{2 ** b}": c for b, c in enumerate(self.counts) if c},
+        }
+
+
+class RunStats:
+    """--stats 계측: 단계(phase)별 프레임 수, 쓴 바이트 수와 지연 시간 히스토그램
+
+    켜져 있을 때만 만들어서 timed() / timed_write() / timed_sleep()으로 렌더, 터미널 쓰기,
+    sleep 함수를 감싼다. 꺼져 있으면 감싸지 않으므로 프레임 루프에 비용이 없다.
+    """
+
+    def __init__(self):
+        self.phase = 'setup'
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    def _phase(self) -> dict:
+        data = self.phases.get(self.phase)
+        if data is None:
+            data = self.phases[self.phase] = {'frames': 0, 'bytes': 0, 'latency': {}}
+        return data
+
+    @contextlib.contextmanager
+    def in_phase(self, phase: str):
+        """잠시 다른 단계 이름으로 기록 (눈 태스크의 다시 그리기처럼 단계와 별개인 프레임용)"""
+        saved = self.phase
+        self.phase = phase
+        try:
+            yield
+        finally:
+            self.phase = saved
+
+    def record(self, metric: str, seconds: float):
+        latency = self._phase()['latency']
+        hist = latency.get(metric)
+        if hist is None:
+            hist = latency[metric] = LatencyHistogram()
+        hist.add(seconds)
+
+    def timed(self, metric: str, func):
+        """func 호출 시간을 metric으로 기록하는 래퍼"""
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(metric, clock() - t0)
+        return wrapper
+
+    def timed_write(self, write):
+        """터미널 쓰기 래퍼: 시간('write'), 프레임 수, 쓴 바이트 수를 기록
+
+        바이트는 payload가 bytes나 str일 때만 센다. Rich 렌더러블처럼 콘솔이 직접 쓰는
+        경우에는 콘솔 파일을 counted_stream()으로 감싸서 센다.
+        """
+        clock = time.perf_counter
+
+        def wrapper(payload):
+            t0 = clock()
+            write(payload)
+            self.record('write', clock() - t0)
+            data = self._phase()
+            data['frames'] += 1
+            if isinstance(payload, (bytes, str)):
+                data['bytes'] += len(payload) if isinstance(payload, bytes) else len(payload.encode('utf-8'))
+        return wrapper
+
+    def counted_stream(self, stream):
+        """stream에 쓰는 글자 수를 UTF-8 바이트로 세는 래퍼 (Rich Console처럼 직접 쓰는 출력용)"""
+        return _CountedStream(stream, self)
+
+    def timed_sleep(self, sleep):
+        """async sleep 래퍼: 요청한 시간보다 늦게 깬 만큼을 'sleep_overshoot'으로 기록"""
+        clock = time.perf_counter
+
+        async def wrapper(delay):
+            t0 = clock()
+            await sleep(delay)
+            self.record('sleep_overshoot', max(0.0, clock() - t0 - delay))
+        return wrapper
+
+    def to_dict(self) -> dict:
+        return {
+            'elapsed_s': round(time.perf_counter() - self.started, 3),
+            'phases': {
+                phase: {'frames': data['frames'], 'bytes': data['bytes'],
+                        'latency': {m: h.to_dict() for m, h in data['latency'].items()}}
+                for phase, data in self.phases.items()
+            },
+        }
+
+    def format(self) -> str:
+        lines = [f"{'phase':<10} {'metric':<16} {'count':>7} {'mean ms':>9} {'p50':>8} {'p90':>8} "
+                 f"{'p99':>8} {'max':>8}"]
+        for phase, data in self.phases.items():
+            for metric, hist in data['latency'].items():
+                d = hist.to_dict()
+                lines.append(f"{phase:<10} {metric:<16} {d['count']:>7} {d['mean_ms']:>9.3f} {d['p50_ms']:>8.3f} "
+                             f"{d['p90_ms']:>8.3f} {d['p99_ms']:>8.3f} {d['max_ms']:>8.3f}")
+            if data['frames']:
+                lines.append(f"{phase:<10} {data['frames']} frames, {data['bytes']} bytes "
+                             f"({data['bytes'] / data['frames']:.0f} bytes/frame)")
+        return '\n'.join(lines)
+
+    def report(self, path: str = '-'):
+        """path가 '-'이면 요약 표를 stderr에, 아니면 JSON을 파일에 씀"""
+        import json
+        if path == '-':
+            print(self.format(), file=sys.stderr)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, indent=2)
+
+
+class _CountedStream:
+    """쓴 내용을 RunStats의 현재 단계 bytes에 더하는 텍스트 스트림 (나머지 속성은 stream 것)"""
+
+    def __init__(self, stream, stats: RunStats):
+        self._stream = stream
+        self._stats = stats
+
+    def write(self, text: str):
+        self._stats._phase()['bytes'] += len(text.encode('utf-8'))
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# 기본 음악 파일 경로 (--music으로 바꾸거나 --music ''로 끌 수 있음)
+MUSIC_PATH = '/Users/seungmin/Desktop/tree/Santa-/JINGLE_BELLS .mp3'
+
+
+def music_command(path: str) -> list:
+    """음악 재생 명령 (macOS에서는 afplay, 그 외에는 ffplay)"""
+    import platform
+    if platform.system() == 'Darwin':
+        return ['afplay', path]
+    return ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet', path]
+
+
+async def play_music(path: str | None):
+    """음악 재생 프로세스를 띄우고 끝날 때까지 기다리는 태스크
+
+    취소되면 (정상 종료, q, Ctrl-C 모두) 프로세스를 terminate하고, 1초 안에 끝나지
+    않으면 kill한다.
+    """
+    import asyncio
+    import subprocess
+    if not path or not os.path.exists(path):
+        return
+    try:
+        proc = await asyncio.create_subprocess_exec(*music_command(path), stdin=subprocess.DEVNULL,
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        print(f"Warning: could not start music: {e}", file=sys.stderr)
+        return
+    try:
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+
+
+class AnimationControl:
+    """키보드로 바꾸는 애니메이션 상태
+
+    space/p: 일시정지 토글, +/=: 빠르게, -: 느리게, t: 지금 해체 시작, q: 종료
+    """
+
+    SPEED_STEP = 1.5
+
+    def __init__(self):
+        import asyncio
+        self.speed_factor = 1.0
+        self.teardown = False
+        self.quit = False
+        self.resized = False
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+        self.changed = asyncio.Event()
+
+    @property
+    def paused(self) -> bool:
+        return not self.resumed.is_set()
+
+    def handle_keys(self, keys: str):
+        for key in keys.lower():
+            if key in ' p':
+                if self.paused:
+                    self.resumed.set()
+                else:
+                    self.resumed.clear()
+            elif key in '+=':
+                self.speed_factor *= self.SPEED_STEP
+            elif key == '-':
+                self.speed_factor /= self.SPEED_STEP
+            elif key == 't':
+                self.teardown = True
+            elif key == 'q':
+                self.quit = True
+                self.resumed.set()
+            else:
+                continue
+            self.changed.set()
+
+    def handle_resize(self):
+        """SIGWINCH: 다음 프레임에서 레이아웃을 다시 맞추도록 표시"""
+        self.resized = True
+        self.changed.set()
+
+    async def sleep(self, delay: float):
+        """delay초 기다림. 키 입력이 들어오면 바로 깸"""
+        import asyncio
+        self.changed.clear()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_resumed(self) -> float:
+        """일시정지 중이면 풀릴 때까지 기다리고 멈춰 있던 시간을 반환"""
+        if not self.paused:
+            return 0.0
+        started = time.monotonic()
+        await self.resumed.wait()
+        return time.monotonic() - started
+
+
+@contextlib.contextmanager
+def resize_signal(control: AnimationControl):
+    """SIGWINCH를 받으면 control.handle_resize()를 부름 (SIGWINCH가 없는 플랫폼에서는 무시)"""
+    import asyncio
+    sigwinch = getattr(signal, 'SIGWINCH', None)
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(sigwinch, control.handle_resize)
+    except (TypeError, ValueError, NotImplementedError, RuntimeError):
+        yield
+        return
+    try:
+        yield
+    finally:
+        loop.remove_signal_handler(sigwinch)
+
+
+@contextlib.contextmanager
+def keyboard_controls(control: AnimationControl, stream=None):
+    """터미널을 cbreak 모드로 두고 키 입력을 이벤트 루프(add_reader)에서 읽음
+
+    stream이 tty가 아니거나 termios가 없으면 아무것도 하지 않는다. 나갈 때 터미널
+    설정을 되돌린다.
+    """
+    import asyncio
+    stream = stream if stream is not None else sys.stdin
+    try:
+        fd = stream.fileno()
+        interactive = termios is not None and os.isatty(fd)
+    except (AttributeError, ValueError, OSError):
+        interactive = False
+    if not interactive:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    saved = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+    loop.add_reader(fd, lambda: control.handle_keys(os.read(fd, 64).decode('utf-8', 'ignore')))
+    try:
+        yield
+    finally:
+        loop.remove_reader(fd)
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+async def _run_transition_async(tree, positions, flag: bool, step_time: float, show, control: AnimationControl,
+                                sleep=None):
+    """run_transition의 asyncio 버전 (일시정지, 속도 변경, 종료 키를 반영)
+
+    (FrameScheduler, 일시정지로 멈춰 있던 시간(초))를 반환한다.
+    """
+    sleep = sleep or control.sleep
+    factor = control.speed_factor
+    step = step_time / factor
+    sched = FrameScheduler(max(step, MIN_FRAME_INTERVAL))
+    n = len(positions)
+    steps = _transition_steps(tree, positions, flag, step)
+    done = next(steps)
+    paused = 0.0
+    while True:
+        show()
+        if done >= n or control.quit:
+            break
+        advance = await sched.wait_async(sleep)
+        if control.paused:
+            paused += await control.wait_resumed()
+            sched.rebase()
+        if control.speed_factor != factor:
+            # 속도가 바뀌면 남은 요소를 새 간격으로 다시 나눠서 이어 간다
+            factor = control.speed_factor
+            step = step_time / factor
+            sched.rebase(max(step, MIN_FRAME_INTERVAL))
+            steps = _transition_steps(tree, positions, flag, step, done)
+            done = next(steps)
+        else:
+            done = steps.send(advance)
+    return sched, paused
+
+
+# 눈 입자를 움직이고 다시 그리는 간격 (Rich Live 갱신 주기와 같은 24fps)
+SNOW_INTERVAL = 1 / 24
+
+
+async def _run_snow(snowfall: Snowfall, redraw, control: AnimationControl):
+    """트리 프레임과 별개로 SNOW_INTERVAL마다 눈을 움직이고 redraw()를 부름 (취소될 때까지)"""
+    sched = FrameScheduler(SNOW_INTERVAL)
+    while True:
+        advance = await sched.wait_async()
+        if control.paused:
+            await control.wait_resumed()
+            sched.rebase()
+            continue
+        snowfall.step(advance * sched.interval)
+        redraw()
+
+
+async def animate_tree_async(duration: int = 60, mode: str = 'double', density: float = 0.25, speed: float = 0.5, max_width: int | str = 50, build: bool = False, build_speed: float = 0.02, auto_twinkle: bool = False, gap: int = 1, build_mode: str = 'sequential', seed: int | None = None, teardown: bool = False, teardown_speed: float = 0.02, teardown_mode: str = 'random', scale: int = 1, output: str = 'live', encoder: str = 'rle', music: str | None = MUSIC_PATH, keys: bool = True, stats: RunStats | None = None, effect='blink', snow: int = 0, wind: float = 0.0):
+    """크리스마스 트리 애니메이션 (asyncio 드라이버)
+
+    렌더 루프, 음악 프로세스(play_music), 키보드 입력(keyboard_controls)이 한 이벤트
+    루프에서 함께 돈다. stats(RunStats)를 주면 단계별 계측을 모은다. snow가 있으면
+    눈 태스크(_run_snow)가 트리 프레임 사이에도 화면을 다시 그린다. 나머지 인자는
+    animate_tree와 같다.
+    """
+    import asyncio
+    diff_out = None
+    snow_task = None
+    timing = {}
+    control = AnimationControl()
+    sleep = control.sleep if stats is None else stats.timed_sleep(control.sleep)
+    music_task = asyncio.ensure_future(play_music(music))
+    try:
+        # 한 번만 트리 구조 생성
+        generate = create_tree_structure if stats is None else stats.timed('generate', create_tree_structure)
+        tree_data = generate(mode=mode, density=density, max_width=max_width, gap=gap, scale=scale, seed=seed,
+                             effect=effect)
+        snowfall = Snowfall(snow, *snow_field(tree_data), wind=wind, seed=seed) if snow > 0 else None
+
+        def snow_overlay():
+            return None if snowfall is None else snowfall.overlay
+
+        # 빌드 애니메이션을 위해 모든 요소의 visible 플래그 초기화
+        tree_data.set_all_visible(not build)
+
+        start_time = time.monotonic()
+        frame = 0
+
+        with contextlib.ExitStack() as stack:
+            if keys:
+                stack.enter_context(keyboard_controls(control))
+            stack.enter_context(resize_signal(control))
+
+            def apply_resize():
+                # 터미널 크기가 바뀌면 padding만 다시 계산 (조명 데이터와 바뀌지 않은 행의 캐시는 유지)
+                control.resized = False
+                if max_width == 'auto':
+                    tree_data.relayout(terminal_width(resized=True))
+                if snowfall is not None:
+                    snowfall.resize(*snow_field(tree_data))
+                if diff_out is not None:
+                    # 터미널이 내용을 다시 배치했을 수 있으므로 다음 프레임은 전체를 그림
+                    diff_out.invalidate()
+
+            # 프레임 하나 = render(그릴 내용 만들기) + write(터미널에 쓰기)
+            # Rich가 설치되어 있으면 Live 업데이트로 한 번만 그린 뒤 내부만 업데이트
+            if output == 'live' and load_rich():
+                # 계측 중에는 콘솔이 실제로 쓴 바이트를 센다 (update에 넘기는 건 렌더러블이라 못 셈)
+                console = Console() if stats is None else Console(file=stats.counted_stream(sys.stdout))
+                # 초기 렌더 (TreeRenderable은 ANSI 문자열 없이 모델에서 바로 Segment를 만든다)
+                live = stack.enter_context(Live(TreeRenderable(tree_data, 0), console=console, refresh_per_second=24))
+                # 빌드/해체 중에도 푸터를 함께 보여줌
+                transition_footer = 0
+
+                def render(tree, frame_for_render, footer_frame):
+                    return TreeRenderable(tree, frame_for_render, footer_frame, snow=snow_overlay())
+
+                if stats is None:
+                    write = live.update
+                else:
+                    # 계측 중에는 Live 갱신 스레드 대신 바로 그려서 write 시간에 콘솔 렌더와 출력을 포함
+                    write = stats.timed_write(lambda renderable: live.update(renderable, refresh=True))
+
+                def show_message(msg):
+                    live.update(Text.from_ansi(msg))
+            else:
+                # Rich가 없으면 기존 방식(fallback)
+                if output == 'diff':
+                    diff_out = DiffRenderer()
+                # 빌드/해체 중에는 제목과 트리만 그림
+                transition_footer = None
+
+                if diff_out is not None:
+                    def render(tree, frame_for_render, footer_frame):
+                        snow = snow_overlay()
+                        return diff_out.encode(frame_grid(tree, frame_for_render, footer_frame, snow),
+                                               snow_grid_rows(snow))
+
+                    write = diff_out.write
+                else:
+                    def render(tree, frame_for_render, footer_frame):
+                        return render_fallback_frame(tree, frame_for_render, footer_frame, encoder, snow_overlay())
+
+                    def write(text):
+                        sys.stdout.write(text)
+                        sys.stdout.flush()
+                if stats is not None:
+                    write = stats.timed_write(write)
+
+                def show_message(msg):
+                    clear_screen()
+                    print(msg)
+                    sys.stdout.flush()
+                    if diff_out is not None:
+                        diff_out.invalidate()
+
+            if stats is not None:
+                render = stats.timed('render', render)
+
+            # 마지막으로 그린 (트리 프레임, 푸터 프레임): 눈 태스크가 같은 프레임을 다시 그릴 때 씀
+            shown = [0, transition_footer]
+
+            def show(frame_for_render, footer_frame=None):
+                shown[:] = (frame_for_render, footer_frame)
+                if control.resized:
+                    apply_resize()
+                write(render(tree_data, frame_for_render, footer_frame))
+
+            if snowfall is not None:
+                def redraw_snow():
+                    if stats is None:
+                        show(*shown)
+                        return
+                    # 눈 때문에 다시 그린 프레임은 트리 단계와 섞이지 않게 'snow'로 따로 센다
+                    with stats.in_phase('snow'):
+                        show(*shown)
+
+                snow_task = asyncio.ensure_future(_run_snow(snowfall, redraw_snow, control))
+
+            # 빌드 애니메이션: build_mode 순서대로 visible 켜기
+            if build:
+                if stats is not None:
+                    stats.phase = 'build'
+                schedule = transition_schedule(tree_data, build_mode, seed, phase='build')
+                sched, paused = await _run_transition_async(tree_data, schedule, True, build_speed,
+                                                            lambda: show(0, transition_footer), control, sleep)
+                timing['build'] = sched.summary()
+                # 빌드 중 멈춰 있던 시간도 duration에 세지 않는다
+                start_time += paused
+                if control.paused:
+                    start_time += await control.wait_resumed()
+
+            # 빌드 이후에 자동으로 반짝일지 결정
+            twinkle_enabled = (not build) or auto_twinkle
+            factor = control.speed_factor
+            if stats is not None:
+                stats.phase = 'twinkle'
+            sched = FrameScheduler(speed / factor)  # 애니메이션 속도 조절
+            while time.monotonic() - start_time < duration and not (control.quit or control.teardown):
+                # 제목 + 트리(조명만 깜빡임) + 깜빡이는 푸터를 한 번에 출력
+                # 빌드가 완료되고 auto_twinkle이 False이면 고정된 프레임(0)을 사용
+                # 정상 상태에서는 서로 다른 프레임이 4개뿐이라 캐시된 결과를 재사용한다
+                frame_for_render = frame if twinkle_enabled else 0
+                show(frame_for_render, frame)
+
+                # 늦어진 만큼 프레임 번호를 건너뛰어 깜빡임이 실제 시간을 따라가게 함
+                advance = await sched.wait_async(sleep)
+                if control.paused:
+                    # 멈춰 있던 시간은 duration에 세지 않는다
+                    start_time += await control.wait_resumed()
+                    sched.rebase()
+                if control.speed_factor != factor:
+                    factor = control.speed_factor
+                    sched.rebase(speed / factor)
+                frame += advance
+            timing['twinkle'] = sched.summary()
+
+            # teardown phase: teardown_mode 순서대로 요소 제거 (t 키로 일찍 시작할 수도 있음)
+            if (teardown or control.teardown) and not control.quit:
+                if stats is not None:
+                    stats.phase = 'teardown'
+                schedule = transition_schedule(tree_data, teardown_mode, seed, phase='teardown')
+                sched, _ = await _run_transition_async(tree_data, schedule, False, teardown_speed,
+                                                       lambda: show(0, transition_footer), control, sleep)
+                timing['teardown'] = sched.summary()
+
+                # final message (눈 태스크가 메시지 위에 다시 그리지 않도록 먼저 멈춤)
+                if snow_task is not None:
+                    snow_task.cancel()
+                if not control.quit:
+                    show_message(f"\n{Colors.BOLD}{Colors.GREEN}🎄 Happy Solo Christmas 🎄{Colors.RESET}\n")
+                    await control.sleep(2.0)
+
+        if control.quit:
+            if diff_out is not None:
+                diff_out.close()
+            clear_screen()
+            print(f"{Colors.GREEN}{Colors.BOLD}🎄 Happy Holidays! 🎄{Colors.RESET}\n")
+    finally:
+        # 정상 종료, q, Ctrl-C 어느 경우에도 눈 태스크와 음악 프로세스를 정리
+        if snow_task is not None:
+            snow_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await snow_task
+        music_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await music_task
+        if diff_out is not None:
+            diff_out.close()
+            print(diff_out.stats(), file=sys.stderr)
+    return timing
+
+
+def animate_tree(duration: int = 60, mode: str = 'double', density: float = 0.25, speed: float = 0.5, max_width: int | str = 50, build: bool = False, build_speed: float = 0.02, auto_twinkle: bool = False, gap: int = 1, build_mode: str = 'sequential', seed: int | None = None, teardown: bool = False, teardown_speed: float = 0.02, teardown_mode: str = 'random', scale: int = 1, output: str = 'live', encoder: str = 'rle', music: str | None = MUSIC_PATH, keys: bool = True, stats: str | None = None, effect='blink', snow: int = 0, wind: float = 0.0):
+    """크리스마스 트리 애니메이션
+
+    output: 'live' (Rich Live, 없으면 plain), 'plain' (매 프레임 화면 전체 재출력),
+            'diff' (바뀐 셀만 출력, 종료 시 프레임당 바이트 수를 stderr에 출력)
+    encoder: ANSI 행 인코더 ('rle' 또는 'plain', plain 출력에 적용)
+    build_mode / teardown_mode: TRANSITION_ORDERS 중 하나
+    max_width: 'auto'이면 터미널 폭에 맞추고, 창 크기가 바뀌면(SIGWINCH) 다시 중앙 정렬
+    music: 재생할 음악 파일 (None이나 ''이면 재생 안 함)
+    keys: 터미널에서 키보드 조작 사용 (AnimationControl 참고)
+    effect: 조명 효과 (EFFECTS의 이름이나 Effect 인스턴스)
+    snow: 트리 위로 내리는 눈 입자 수 (0이면 끔), wind: 눈에 더할 가로 속도 (초당 칸, 음수면 왼쪽)
+    stats: 계측 결과를 남길 곳 ('-'이면 stderr에 요약, 경로면 JSON). Ctrl-C로 끝나도 남긴다
+
+    animate_tree_async를 asyncio.run으로 돌리는 동기 래퍼. 프레임은 FrameScheduler로
+    절대 마감 시각에 맞춰 진행한다. 반환값은 단계별 {'frames', 'late', 'dropped'} 요약이다.
+    """
+    import asyncio
+    run_stats = RunStats() if stats else None
+    try:
+        return asyncio.run(animate_tree_async(
+            duration=duration, mode=mode, density=density, speed=speed, max_width=max_width, build=build,
+            build_speed=build_speed, auto_twinkle=auto_twinkle, gap=gap, build_mode=build_mode, seed=seed,
+            teardown=teardown, teardown_speed=teardown_speed, teardown_mode=teardown_mode, scale=scale,
+            output=output, encoder=encoder, music=music, keys=keys, stats=run_stats, effect=effect,
+            snow=snow, wind=wind))
+    except KeyboardInterrupt:
+        clear_screen()
+        print(f"{Colors.GREEN}{Colors.BOLD}🎄 Happy Holidays! 🎄{Colors.RESET}\n")
+        sys.exit(0)
+    finally:
+        if run_stats is not None:
+            run_stats.report(stats)
+
+def _width_arg(value: str):
+    return value if value == 'auto' else int(value)
+
+
+def _positive_float(value: str) -> float:
+    x = float(value)
+    if not x > 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number: {value}")
+    return x
+
+
+def _positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return n
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Terminal Christmas tree')
+    parser.add_argument('--duration', type=int, default=60, help='애니메이션 지속 시간(초)')
+    parser.add_argument('--mode', choices=['single', 'double'], default='double', help='트리 모드: single 또는 double')
+    parser.add_argument('--density', type=float, default=0.25, help='조명 밀도 (0-1)')
+    parser.add_argument('--speed', type=_positive_float, default=0.5, help='깜빡임 속도 (초)')
+    parser.add_argument('--width', type=_width_arg, default=50,
+                        help="터미널 폭 기준(중앙 정렬용). 'auto'이면 터미널 폭을 쓰고 창 크기가 바뀌면 다시 맞춤")
+    parser.add_argument('--build', action='store_true', help='빌드 애니메이션을 활성화')
+    parser.add_argument('--build-speed', type=float, default=0.02, help='빌드 애니메이션 속도 (요소당 초, 전체 길이 = 요소 수 x 값)')
+    parser.add_argument('--auto-twinkle', action='store_true', help='빌드 후 자동으로 조명이 반짝이게 함')
+    parser.add_argument('--gap', type=int, default=1, help='두 삼각형 사이 공백 줄 수 (double 모드)')
+    parser.add_argument('--teardown', action='store_true', help='애니메이션 종료 시 트리를 무작위로 사라지게 함')
+    parser.add_argument('--teardown-speed', type=float, default=0.02, help='트리 사라짐 속도 (요소당 초)')
+    parser.add_argument('--teardown-mode', choices=TRANSITION_ORDERS, default='random', help='트리를 사라지게 하는 순서')
+    parser.add_argument('--build-mode', choices=TRANSITION_ORDERS, default='sequential',
+                        help='빌드 순서: sequential, reverse, random, topdown, radial, spiral')
+    parser.add_argument('--seed', type=int, default=None, help='무작위 시드: 조명 배치와 빌드/해체 순서 (선택적)')
+    parser.add_argument('--effect', choices=list(EFFECTS), default='blink',
+                        help='조명 효과: blink(기본 깜빡임), duty(조명마다 다른 주기), chase(물결), '
+                             'fade(트루컬러 밝기 변화), sparkle(무작위 반짝임)')
+    parser.add_argument('--snow', metavar='N', type=int, default=0,
+                        help='트리 위로 눈 입자 N개를 내림 (실시간 재생에서만, 24fps로 트리 프레임과 따로 갱신)')
+    parser.add_argument('--wind', type=float, default=0.0, help='눈에 더할 바람 세기 (초당 칸, 음수면 왼쪽으로)')
+    parser.add_argument('--scale', type=_positive_int, default=1, help='트리 크기 배율 (큰 화면용)')
+    parser.add_argument('--output', choices=['live', 'plain', 'diff'], default='live',
+                        help='출력 방식: live (Rich), plain (매 프레임 전체 출력), diff (바뀐 셀만 출력)')
+    parser.add_argument('--encoder', choices=['rle', 'plain'], default='rle',
+                        help='ANSI 인코더: rle (같은 색 구간마다 escape) 또는 plain (셀마다 escape)')
+    parser.add_argument('--export', metavar='FILE', default=None,
+                        help='실시간으로 재생하지 않고 애니메이션을 파일로 기록 (.cast = asciicast v2, 그 외 raw ANSI)')
+    parser.add_argument('--export-format', choices=['cast', 'ansi'], default=None,
+                        help='기록 형식 (기본: 파일 확장자로 결정)')
+    parser.add_argument('--prerender', metavar='N', type=int, default=0,
+                        help='N개 프로세스에서 프레임을 미리 렌더 (--export에도 적용, 실시간 재생에서는 키보드 조작/음악 없음)')
+    parser.add_argument('--serve', metavar='PORT', type=int, default=None,
+                        help='브로드캐스트 서버 모드: 한 번 렌더한 프레임을 TCP 클라이언트(nc localhost PORT)에 전송')
+    parser.add_argument('--host', default='127.0.0.1', help='서버 모드에서 바인드할 주소')
+    parser.add_argument('--music', metavar='FILE', default=MUSIC_PATH, help="재생할 음악 파일 ('' 이면 재생 안 함)")
+    parser.add_argument('--stats', metavar='PATH', nargs='?', const='-', default=None,
+                        help='단계별 계측(렌더/쓰기/sleep 지연 히스토그램, 바이트, 프레임 수)을 종료 시 stderr에 출력. '
+                             'PATH를 주면 JSON으로 저장')
+    parser.add_argument('--no-keys', action='store_true',
+                        help='키보드 조작 끄기 (기본: space/p 일시정지, +/- 속도, t 해체, q 종료)')
+    parser.add_argument('--play', metavar='FILE', default=None, help='기록한 파일을 기록된 시각에 맞춰 재생')
+    parser.add_argument('--play-speed', type=float, default=1.0, help='재생 배속')
+    args = parser.parse_args()
+
+    if args.play:
+        try:
+            play_recording(args.play, speed=args.play_speed)
+        except KeyboardInterrupt:
+            sys.stdout.write('\033[?25h\n')
+        sys.exit(0)
+
+    if args.serve is not None:
+        import asyncio
+        tree = create_tree_structure(mode=args.mode, density=args.density, max_width=args.width, gap=args.gap,
+                                     scale=args.scale, seed=args.seed, effect=args.effect)
+        try:
+            asyncio.run(serve_tree(
+                tree, host=args.host, port=args.serve,
+                ready=lambda port: print(f"serving on {args.host}:{port} (nc {args.host} {port})", file=sys.stderr),
+                duration=args.duration, speed=args.speed, build=args.build, build_speed=args.build_speed,
+                auto_twinkle=args.auto_twinkle, build_mode=args.build_mode, seed=args.seed,
+                teardown=args.teardown, teardown_speed=args.teardown_speed, teardown_mode=args.teardown_mode))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if args.export:
+        fmt = args.export_format or ('cast' if args.export.endswith('.cast') else 'ansi')
+        tree = create_tree_structure(mode=args.mode, density=args.density, max_width=args.width, gap=args.gap,
+                                     scale=args.scale, seed=args.seed, effect=args.effect)
+        started = time.perf_counter()
+        n_frames, n_bytes = export_animation(
+            args.export, tree, fmt=fmt, duration=args.duration, speed=args.speed, build=args.build,
+            build_speed=args.build_speed, auto_twinkle=args.auto_twinkle, build_mode=args.build_mode,
+            seed=args.seed, teardown=args.teardown, teardown_speed=args.teardown_speed,
+            teardown_mode=args.teardown_mode, workers=args.prerender)
+        print(f"{args.export}: {n_frames} frames, {n_bytes} bytes ({time.perf_counter() - started:.2f}s)",
+              file=sys.stderr)
+        sys.exit(0)
+
+    if args.prerender > 0:
+        tree = create_tree_structure(mode=args.mode, density=args.density, max_width=args.width, gap=args.gap,
+                                     scale=args.scale, seed=args.seed, effect=args.effect)
+        try:
+            play_prerendered(tree, args.prerender, duration=args.duration, speed=args.speed, build=args.build,
+                             build_speed=args.build_speed, auto_twinkle=args.auto_twinkle, build_mode=args.build_mode,
+                             seed=args.seed, teardown=args.teardown, teardown_speed=args.teardown_speed,
+                             teardown_mode=args.teardown_mode)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
 
-    animate_tree(duration=args.duration, mode=args.mode, density=args.density, speed=args.speed, max_width=args.width, build=args.build, build_speed=args.build_speed, auto_twinkle=args.auto_twinkle, gap=args.gap, build_mode=args.build_mode, seed=args.seed, teardown=args.teardown, teardown_speed=args.teardown_speed, teardown_mode=args.teardown_mode)
+    animate_tree(duration=args.duration, mode=args.mode, density=args.density, speed=args.speed, max_width=args.width, build=args.build, build_speed=args.build_speed, auto_twinkle=args.auto_twinkle, gap=args.gap, build_mode=args.build_mode, seed=args.seed, teardown=args.teardown, teardown_speed=args.teardown_speed, teardown_mode=args.teardown_mode, scale=args.scale, output=args.output, encoder=args.encoder, music=args.music, keys=not args.no_keys, stats=args.stats, effect=args.effect, snow=args.snow, wind=args.wind)
@@ -0,0 +1,166 @@
+import io
+import math
+import re
+
+import pytest
+
+import christmas_tree as ct
+
+
+def make_tree(effect=None, **kwargs):
+    kwargs.setdefault('max_width', 50)
+    kwargs.setdefault('seed', 7)
+    return ct.create_tree_structure(effect=effect, **kwargs)
+
+
+@pytest.mark.parametrize('effect', [ct.Chase(spacing=6), ct.Fade(period=10), 'blink', 'duty'],
+                         ids=['chase6', 'fade10', 'blink', 'duty'])
+def test_full_frame_cache_keeps_footer(effect):
+    # 효과 주기가 4의 배수가 아니어도 캐시된 화면의 푸터는 frame % 4를 따라야 한다
+    tree = make_tree(effect)
+    period = math.lcm(tree.effect.period, 4)
+    for frame in range(2 * period):
+        expected = (ct.TITLE + '\n\n' + ct.print_tree_with_lights(tree, frame) + '\n\n'
+                    + ct.footer_for(frame))
+        assert ct.render_full_ansi(tree, frame) == expected, frame
+        if ct.load_rich():
+            assert ct.render_full_rich(tree, frame).plain == ct.Text.from_ansi(expected).plain, frame
+
+
+def fallback_expected(tree, frame, footer_frame):
+    body = ct.print_tree_with_lights(tree, frame, cached=False)
+    out = '\033[2J\033[H' + ct.TITLE + '\n\n' + body + '\n'
+    if footer_frame is not None:
+        out += f"\n{ct.footer_for(footer_frame)}\n\n"
+    return out
+
+
+@pytest.mark.parametrize('effect', ['blink', 'duty', 'chase', 'fade'])
+def test_fallback_cache_follows_visibility(effect):
+    # visible이 바뀌면 버전이 올라가서 이전 프레임을 다시 쓰지 않아야 한다
+    tree = make_tree(effect)
+    schedule = ct.transition_schedule(tree, 'random', seed=1)
+    for hidden in (0, len(schedule) // 3, len(schedule)):
+        tree.set_all_visible(True)
+        tree.set_visible_many(schedule[:hidden], False)
+        for frame in range(12):
+            for footer in (None, frame):
+                assert ct.render_fallback_frame(tree, frame, footer) == fallback_expected(tree, frame, footer)
+
+
+def test_frame_cache_separates_trees():
+    a = make_tree('blink', seed=1)
+    b = make_tree('blink', seed=2)
+    for frame in range(4):
+        assert ct.render_full_ansi(a, frame) != ct.render_full_ansi(b, frame)
+        assert ct.render_fallback_frame(b, frame, frame) == fallback_expected(b, frame, frame)
+
+
+def console_output(renderable):
+    from rich.console import Console
+    console = Console(file=io.StringIO(), force_terminal=True, color_system='truecolor', width=200)
+    console.print(renderable)
+    # 끝 줄바꿈 개수는 렌더러블마다 달라서 떼고 비교한다
+    return console.file.getvalue().rstrip('\n')
+
+
+@pytest.mark.parametrize('effect', list(ct.EFFECTS))
+def test_rich_native_matches_ansi(effect):
+    # 네이티브 렌더러블(Segment)과 ANSI 문자열을 거친 Text가 같은 화면을 그려야 한다
+    pytest.importorskip('rich')
+    from rich.segment import Segments
+    assert ct.load_rich()
+    tree = make_tree(effect)
+    for frame in range(8):
+        expected = console_output(ct.Text.from_ansi(ct.render_full_ansi(tree, frame)))
+        assert console_output(ct.TreeRenderable(tree, frame)) == expected, frame
+        for cells in ct.render_row_cells(tree, frame):
+            assert (console_output(Segments(ct.cells_to_segments(cells)))
+                    == console_output(ct.Text.from_ansi(ct.encode_cells(cells))))
+
+
+_CSI = re.compile(r'\033\[([0-9;?]*)([A-Za-z])')
+
+
+def apply_ansi(screen: dict, data: str):
+    """DiffRenderer가 쓰는 escape만 해석하는 작은 터미널: screen[(y, x)] = (글자, SGR 목록)"""
+    y = x = 0
+    style = ()
+    pos = 0
+    for m in list(_CSI.finditer(data)) + [None]:
+        end = m.start() if m else len(data)
+        for ch in data[pos:end]:
+            w = ct.glyph_width(ch)
+            screen[(y, x)] = (ch, style)
+            for i in range(1, w):
+                screen[(y, x + i)] = ('', style)
+            x += w
+        if m is None:
+            break
+        pos = m.end()
+        params, cmd = m.groups()
+        if cmd == 'm':
+            style = () if params in ('', '0') else style + (params,)
+        elif cmd == 'H':
+            row, _, col = params.partition(';')
+            y, x = int(row or 1) - 1, int(col or 1) - 1
+        elif cmd == 'J' and params == '2':
+            screen.clear()
+        elif cmd == 'K':
+            for key in [k for k in screen if k[0] == y and k[1] >= x]:
+                del screen[key]
+    return screen
+
+
+def full_screen(grid):
+    data = ''.join(f'\033[{y + 1};1H' + ct.encode_cells(row) for y, row in enumerate(grid))
+    return apply_ansi({}, data)
+
+
+def test_diff_renderer_reproduces_full_frames():
+    # 빈 화면에 diff만 이어서 적용한 결과가 매 프레임 전체를 새로 그린 화면과 같아야 한다
+    tree = make_tree('fade', max_width=60)
+    snow = ct.Snowfall(120, *ct.snow_field(tree), wind=1.0, seed=3)
+    schedule = ct.transition_schedule(tree, 'spiral', seed=2)
+    renderer = ct.DiffRenderer(stream=io.BytesIO())
+    screen = {}
+    tree.set_all_visible(False)
+    for frame in range(60):
+        if frame < 20:
+            tree.set_visible_many(schedule[frame * len(schedule) // 20:(frame + 1) * len(schedule) // 20], True)
+        elif frame == 40:
+            tree.relayout(40)
+        overlay = None
+        if 25 <= frame < 50:
+            snow.step(ct.SNOW_INTERVAL)
+            overlay = snow.overlay
+        footer = None if frame < 20 else frame
+        grid = ct.frame_grid(tree, frame, footer, overlay)
+        apply_ansi(screen, renderer.encode(grid, ct.snow_grid_rows(overlay)).decode('utf-8'))
+        assert screen == full_screen(grid), frame
+
+
+@pytest.mark.parametrize('mode', ['single', 'double'])
+def test_transition_schedule_same_with_and_without_numpy(monkeypatch, mode):
+    # 같은 시드면 NumPy 배열이든 array.array든 같은 순서가 나와야 한다
+    if ct.load_numpy() is None:
+        pytest.skip('NumPy not installed')
+    kwargs = dict(mode=mode, max_width=90, scale=2, density=0.3, seed=11)
+    monkeypatch.setattr(ct, 'NUMPY_MIN_SIZE', 0)
+    with_numpy = make_tree(**kwargs)
+    monkeypatch.setattr(ct, 'NUMPY_MIN_SIZE', 10 ** 9)
+    pure = make_tree(**kwargs)
+    assert with_numpy.np is not None and pure.np is None
+    for order in ct.TRANSITION_ORDERS:
+        for phase in ('build', 'teardown'):
+            a = [int(i) for i in ct.transition_schedule(with_numpy, order, seed=5, phase=phase)]
+            b = [int(i) for i in ct.transition_schedule(pure, order, seed=5, phase=phase)]
+            assert a == b, (order, phase)
+
+
+@pytest.mark.parametrize('order', ct.TRANSITION_ORDERS)
+def test_transition_schedule_is_replayable_permutation(order):
+    tree = make_tree(max_width=70, scale=2)
+    first = [int(i) for i in ct.transition_schedule(tree, order, seed=3)]
+    assert sorted(first) == list(range(len(first)))
+    assert [int(i) for i in ct.transition_schedule(tree, order, seed=3)] == first